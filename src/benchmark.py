@@ -0,0 +1,305 @@
+'''
+Micro-benchmarks for the hot paths of the bot. Each benchmark first checks that the optimized path gives the same
+result as its reference implementation, then times both.
+
+Usage (from src):
+    python benchmark.py            Runs every benchmark
+    python benchmark.py search     Runs only the given benchmarks
+'''
+import sys, time
+
+
+def timed(function, repeat: int) -> float:
+    '''
+    Returns the average time of function() in milliseconds.
+    '''
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_search() -> None:
+    '''
+    Fuzzy item search: full scan of all item names against the inverted token index.
+    '''
+    from helper import all_name_to_id
+    from search import Search
+
+    search = Search()
+    queries = ["blackstar vediant", "elixir death", "ultimate gervish", "meat stew", "mineral water",
+               "tet kzarka", "beer", "crystal", "draught", "serap"]
+    queries += [" ".join(word[:4] for word in name.lower().split()) for name in list(all_name_to_id)[::500]]
+
+    for query in queries:
+        assert search._get_id_and_name(query, all_name_to_id) == search._scan_id_and_name(query, all_name_to_id), query
+
+    scan = timed(lambda: [search._scan_id_and_name(query, all_name_to_id) for query in queries], 3) / len(queries)
+    index = timed(lambda: [search._get_id_and_name(query, all_name_to_id) for query in queries], 3) / len(queries)
+    print(f"search ({len(all_name_to_id):,} names, {len(queries)} queries)")
+    print(f"    full scan:      {scan:.3f} ms/query")
+    print(f"    token index:    {index:.3f} ms/query")
+
+
+def bench_suggest() -> None:
+    '''
+    Typo tolerant "did you mean" suggestions over all item names.
+    '''
+    from helper import all_name_to_id
+    from search import Search
+
+    search = Search()
+    queries = ["blckstar vediant", "vedaint", "elixr of deth", "ultimat gervsh", "meat stw", "minral water"]
+    queries += [" ".join(word[:-2] + word[-1:] + word[-2] if len(word) > 3 else word for word in name.lower().split())
+                for name in list(all_name_to_id)[::500]] # Swap the last two letters of every word
+
+    cold = timed(lambda: [search.suggest(query, all_name_to_id) for query in queries], 1) / len(queries)
+    warm = timed(lambda: [search.suggest(query, all_name_to_id) for query in queries], 10) / len(queries)
+    print(f"suggest ({len(all_name_to_id):,} names, {len(queries)} queries)")
+    print(f"    first query:    {cold:.3f} ms/query")
+    print(f"    repeated query: {warm:.3f} ms/query")
+
+
+def bidding_payloads(count: int, price_points: int=100, seed: int=0) -> list:
+    '''
+    Returns count Huffman packed GetBiddingInfoList style payloads of price_points "price-sellers-buyers|" records each.
+    '''
+    import random
+    from unpack_bytes import pack
+
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(count):
+        base = rng.randint(100, 10_000_000)
+        text = "".join(f"{base + i * (base // 100 + 1)}-{rng.randint(0, 5000)}-{rng.randint(0, 300)}|" for i in range(price_points))
+        payloads.append(pack(text))
+    return payloads
+
+
+def bench_huffman() -> None:
+    '''
+    Huffman decoding of bidding payloads: bit by bit reference decoder against the byte table decoder, with and without
+    the decode table cache. Every payload is distinct, as responses of different items are: the hit rate is that of
+    tables shared between different payloads.
+    '''
+    from unpack_bytes import unpack, get_shape_decoder
+
+    for price_points in (10, 100, 1000):
+        payloads = bidding_payloads(200, price_points)
+        for payload in payloads[:20]:
+            assert unpack(payload, fast=True) == unpack(payload, fast=False)
+
+        reference = timed(lambda: [unpack(payload, fast=False) for payload in payloads[:20]], 1) / 20
+        get_shape_decoder.cache_clear()
+        uncached = timed(lambda: [get_shape_decoder.cache_clear() or unpack(payload) for payload in payloads], 1) / len(payloads)
+        get_shape_decoder.cache_clear()
+        cached = timed(lambda: [unpack(payload) for payload in payloads], 1) / len(payloads)
+        hits, misses = get_shape_decoder.cache_info().hits, get_shape_decoder.cache_info().misses
+        print(f"huffman ({len(payloads)} distinct payloads of {price_points} price points, {len(payloads[0]):,} bytes)")
+        print(f"    bit by bit:     {reference:.3f} ms/payload")
+        print(f"    byte table:     {uncached:.3f} ms/payload")
+        print(f"    cached table:   {cached:.3f} ms/payload ({hits / (hits + misses):.0%} hit rate, {misses} tables)")
+
+
+def bench_parsers() -> None:
+    '''
+    Response parsing: round trips every parser, then compares literal_eval and string splitting against parsers.py.
+    '''
+    import ast, json, random
+    from unpack_bytes import pack, unpack
+    from parsers import parse_world_market_sub_list, parse_bidding_info_list, parse_market_price_info,\
+        parse_world_market_list, format_records
+
+    rng = random.Random(0)
+    def response(records: list) -> bytes:
+        return json.dumps({'resultCode': 0, 'resultMsg': format_records(records)}).encode()
+
+    sub_list = [(9601, level, level, 1840, rng.randint(0, 10**6), rng.randint(0, 10**9), 1000, 3000, 1900, 1715000000)
+                for level in range(21)]
+    bidding_info = [(1000 + 10 * i, rng.randint(0, 5000), rng.randint(0, 300)) for i in range(300)]
+    price_info = [rng.randint(1000, 3000) for _ in range(90)]
+    market_list = [(9000 + i, rng.randint(0, 10**6), rng.randint(0, 10**9), rng.randint(100, 10**7)) for i in range(200)]
+
+    assert [tuple(entry) for entry in parse_world_market_sub_list(response(sub_list))] == sub_list
+    assert list(zip(*parse_bidding_info_list(pack(format_records(bidding_info))))) == bidding_info
+    assert list(parse_market_price_info(json.dumps({'resultCode': 0, 'resultMsg': '-'.join(map(str, price_info))}).encode())) == price_info
+    assert [tuple(entry) for entry in parse_world_market_list(response(market_list))] == market_list
+    assert [tuple(entry) for entry in parse_world_market_list(pack(format_records(market_list)))] == market_list
+
+    sub_list_response = response(sub_list)
+    bidding_info_response = pack(format_records(bidding_info))
+    def split_sub_list():
+        entries = ast.literal_eval(sub_list_response.decode())['resultMsg'].split('|')[:-1]
+        return [[int(info) for info in entry.split('-')] for entry in entries]
+    def split_bidding_info():
+        price_points = [price_point.split('-') for price_point in unpack(bidding_info_response).split('|')[:-1]]
+        return [{'price': int(p[0]), 'sellers': int(p[1]), 'buyers': int(p[2])} for p in price_points]
+
+    unpack(bidding_info_response) # Warm the decoder cache, so that only parsing is compared
+    print(f"parsers (21 enhancement levels, 300 price points)")
+    print(f"    sublist, literal_eval:       {timed(split_sub_list, 1000):.4f} ms")
+    print(f"    sublist, parsers:            {timed(lambda: parse_world_market_sub_list(sub_list_response), 1000):.4f} ms")
+    print(f"    bidding info, dicts:         {timed(split_bidding_info, 1000):.4f} ms")
+    print(f"    bidding info, parsers:       {timed(lambda: parse_bidding_info_list(bidding_info_response), 1000):.4f} ms")
+
+
+def bench_snapshot() -> None:
+    '''
+    Price ladder of an item: list of dicts scanned in Python against a MarketSnapshot of int64 columns.
+    '''
+    import random, tracemalloc
+    from array import array
+    from parsers import SubListEntry, BiddingInfo
+    from snapshot import MarketSnapshot
+
+    def scan(price_max: int, price_min: int, bidding_info: list) -> tuple:
+        compare_price_listed, min_listed = price_max, (None, None)
+        compare_price_bid, max_bid = price_min, (None, None)
+        for price_point in bidding_info:
+            if price_point['sellers'] != 0 and price_point['price'] <= compare_price_listed:
+                compare_price_listed = price_point['price']
+                min_listed = (price_point['price'], price_point['sellers'])
+            if price_point['buyers'] != 0 and price_point['price'] >= compare_price_bid:
+                compare_price_bid = price_point['price']
+                max_bid = (price_point['price'], price_point['buyers'])
+        return min_listed, max_bid
+
+    rng = random.Random(0)
+    for price_points in (10, 100, 1000):
+        entry = SubListEntry(9601, 0, 0, 1840, 100, 10**6, 1000, 1000 + 10 * price_points, 1900, 1715000000)
+        ladder = [(1000 + 10 * i, rng.choice((0, rng.randint(1, 5000))), rng.choice((0, rng.randint(1, 300))))
+                  for i in range(price_points)]
+
+        tracemalloc.start()
+        dicts = [{'price': price, 'sellers': sellers, 'buyers': buyers} for price, sellers, buyers in ladder]
+        dicts_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        snapshot = MarketSnapshot(0, entry, BiddingInfo(*(array('q', column) for column in zip(*ladder))))
+        snapshot_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        assert scan(entry.price_max, entry.price_min, dicts) == (snapshot.min_listed(), snapshot.max_bid())
+        print(f"snapshot ({price_points} price points)")
+        print(f"    dicts:          {dicts_size / 1024:.1f} KiB, "
+              f"{timed(lambda: scan(entry.price_max, entry.price_min, dicts), 1000):.4f} ms/query")
+        print(f"    MarketSnapshot: {snapshot_size / 1024:.1f} KiB, "
+              f"{timed(lambda: (snapshot.min_listed(), snapshot.max_bid()), 1000):.4f} ms/query")
+
+
+def bench_leaderboard() -> None:
+    '''
+    Profit ranking of every craftable item: one scalar pass per item against the recipe x ingredient matrix, with random
+    prices.
+    '''
+    import asyncio, random
+    import crafting
+    from leaderboard import leaderboard
+    from profit import ProfitEngine
+    from recipes import VENDOR, DROP
+    from helper import static_items
+
+    matrix = asyncio.run(leaderboard.load_engine()).matrix
+    rng = random.Random(0)
+    prices = {id: rng.randint(1, 10**6) for id in matrix.market_ids if id is not None}
+    item_ids = {name: matrix.market_ids[column] for name, column in zip(matrix.names, matrix.item_columns)
+                if column < len(matrix.market_ids)}
+    prices.update((id, rng.randint(1, 10**6)) for id in item_ids.values())
+    mastery = crafting.mastery_bracket(1000)
+
+    def scalar() -> list:
+        profits = []
+        for name, craftable in leaderboard.store.all().items():
+            lowest = None
+            for recipe in craftable.recipes.values():
+                cost = 0
+                for ingredient in recipe.ingredients:
+                    price = static_items[ingredient.name] if ingredient.kind == VENDOR else 0 if ingredient.kind == DROP \
+                        else prices.get(leaderboard.market_id(ingredient.name))
+                    cost = None if price is None or cost is None else cost + float(ingredient.quantity) * price
+                if cost is not None and (lowest is None or cost < lowest):
+                    lowest = cost
+            rare_price = prices.get(leaderboard.market_id(craftable.higher_grade)) if craftable.higher_grade else 0
+            if lowest is None or name not in item_ids or rare_price is None:
+                continue
+            profits.append((crafting.item_value(craftable.category, name, mastery, prices[item_ids[name]], rare_price) - lowest, name))
+        return [name for margin, name in sorted(profits, key=lambda profit: -profit[0])]
+
+    assert scalar()[:10] == [profit.name for profit in matrix.rank(prices, mastery, limit=10)]
+    print(f"leaderboard ({len(matrix.names):,} craftable items, {len(matrix.recipe_numbers):,} recipes)")
+    print(f"    scalar:         {timed(scalar, 1):.1f} ms")
+    print(f"    matrix:         {timed(lambda: matrix.rank(prices, mastery, limit=10), 10):.1f} ms")
+
+    engine = ProfitEngine(matrix)
+    engine.update_prices(prices)
+    assert engine.rank(mastery) == matrix.rank(prices, mastery)
+    ids = [id for id in matrix.market_ids if id is not None]
+    def update() -> None:
+        id = rng.choice(ids)
+        prices[id] = rng.randint(1, 10**6)
+        engine.update_prices({id: prices[id]})
+    print(f"    one price update, incremental: {timed(update, 1000):.3f} ms")
+    assert engine.rank(mastery) == matrix.rank(prices, mastery)
+
+
+def bench_workers() -> None:
+    '''
+    Event loop lag while 200 concurrent commands each decode a bidding payload and search item names: inline against
+    pools of worker processes. Lag is how late a 1 ms timer fires on the event loop.
+    '''
+    import asyncio
+    from helper import all_name_to_id
+    from search import Search
+    from parsers import parse_bidding_info_list
+    from workers import WorkerPool
+
+    search = Search()
+    payloads = bidding_payloads(200, 1000)
+    queries = ["blckstar vediant", "elixr of deth", "ultimat gervsh", "meat stw", "minral water", "tet kzarka"]
+
+    async def command(pool: WorkerPool, payload: bytes, query: str) -> None:
+        await pool.parse(parse_bidding_info_list, payload)
+        await pool.did_you_mean(search, query, all_name_to_id)
+        await pool.find_item(search, query, False, all_name_to_id)
+
+    async def commands(pool: WorkerPool) -> tuple[list, float]:
+        lags, done = [], False
+        async def ticker() -> None:
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append((time.perf_counter() - start) * 1000 - 1)
+
+        ticking = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(command(pool, payload, queries[i % len(queries)]) for i, payload in enumerate(payloads)))
+        elapsed = time.perf_counter() - start
+        done = True
+        await ticking
+        return sorted(lags), elapsed
+
+    print(f"workers ({len(payloads)} commands, {len(payloads[0]):,} byte payloads)")
+    for workers in (0, 2, 4):
+        pool = WorkerPool(workers)
+        pool.start()
+        asyncio.run(commands(pool)) # Warms every worker
+        lags, elapsed = asyncio.run(commands(pool))
+        pool.close()
+        print(f"    {workers} workers:      lag p50 {lags[len(lags) // 2]:.2f} ms, p99 {lags[len(lags) * 99 // 100]:.2f} ms, "
+              f"max {lags[-1]:.2f} ms, {elapsed * 1000:.0f} ms in total")
+
+
+BENCHMARKS = {
+    'search': bench_search,
+    'suggest': bench_suggest,
+    'huffman': bench_huffman,
+    'parsers': bench_parsers,
+    'snapshot': bench_snapshot,
+    'leaderboard': bench_leaderboard,
+    'workers': bench_workers,
+    }
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -1,17 +1,66 @@
 import discord, os
+from typing import Union
 from dotenv import load_dotenv
 from discord.ext import tasks
 from item import *
+from prices import poller
 from message import Item as ItemMessage
 from message import Craftable as CraftableMessage
+from message import Suggestions as SuggestionsMessage
+from message import History as HistoryMessage
+from message import Leaderboard as LeaderboardMessage
+from message import Sweep as SweepMessage
+from leaderboard import leaderboard, CATEGORIES
+from workers import pool
+import helper
 
 item_message = ItemMessage()
 craftable_message = CraftableMessage()
+suggestions_message = SuggestionsMessage()
+history_message = HistoryMessage()
+leaderboard_message = LeaderboardMessage()
+sweep_message = SweepMessage()
 
 channel_id_test = 715392947608354886
 
-def run_discord_bot():
-    client = discord.Client(intents=discord.Intents.all())
+# Seconds for which polled prices are used per command instead of asking the trade market, see prices.price_table
+MAX_AGE = {
+    '!m': float(os.getenv('MARKET_MAX_AGE', 300)),
+    '!r': float(os.getenv('RECIPE_MAX_AGE', 1200)),
+    '!top': float(os.getenv('TOP_MAX_AGE', 1200)),
+    }
+
+async def send_suggestions(channel: discord.abc.Messageable, input: str, data: dict) -> bool:
+    '''
+    Sends "did you mean" suggestions instead of market info if input does not match any item well, so that no market
+    lookups are spent on a wrong guess. Returns whether suggestions were sent.
+    '''
+    suggestions = await pool.did_you_mean(search, input, data)
+    if not suggestions:
+        return False
+
+    embed = discord.Embed(colour=discord.Colour.red(),
+                          description=suggestions_message.deliverable(suggestions),
+                          title=f"{input} (Did you mean)")
+    await channel.send(embed=embed)
+    return True
+
+def run_discord_bot(sharded: bool=False, shard_ids: Union[list, None]=None, shard_count: Union[int, None]=None,
+                    poll: bool=True) -> None:
+    '''
+    Runs the bot until it is stopped.
+
+    PARAMS:
+    sharded: Whether to connect through AutoShardedClient, with one gateway connection per shard
+    shard_ids: Shards this process connects, all of them if None. Requires shard_count.
+    shard_count: Total number of shards of the bot, as many as Discord recommends if None
+    poll: Whether this process polls the market. Only one process of a sharded bot should, see main.py. The others
+          follow the passes it publishes in the shared backend.
+    '''
+    if sharded or shard_ids is not None or shard_count is not None:
+        client = discord.AutoShardedClient(intents=discord.Intents.all(), shard_ids=shard_ids, shard_count=shard_count)
+    else:
+        client = discord.Client(intents=discord.Intents.all())
 
     '''
     @tasks.loop(seconds = 30)
@@ -30,7 +79,11 @@ def run_discord_bot():
     @client.event
     async def on_ready():
         print("We have logged in as {0.user}".format(client))
+        if isinstance(client, discord.AutoShardedClient):
+            print(f"Connected shards {sorted(client.shards)} of {client.shard_count}")
         # pearl_alert.start()
+        if poller.interval > 0:
+            poller.start(follow=not poll)
     
     @client.event
     async def on_message(message):
@@ -41,9 +94,25 @@ def run_discord_bot():
         if message.author == client.user:
             return
 
-        if "!m" in user_message:
+        if "!top" in user_message:
+            terms = user_message.replace('!top', '').split()
+            category = terms.pop(0) if terms and terms[0] in CATEGORIES else None
+            mastery = int(terms[0]) if terms and terms[0].isdigit() else 1000
+
+            profits, unpriced = await leaderboard.top(category, mastery, MAX_AGE['!top'])
+            title = f"Top {category or 'craftable'} profits @{mastery} mastery"
+            embed = discord.Embed(colour=discord.Colour.red(),
+                                  description=leaderboard_message.deliverable(profits, unpriced),
+                                  title=title)
+            
+            await message.channel.send(embed=embed)
+
+        elif "!m" in user_message:
             input = user_message.replace('!m', '').strip()
-            info = Item(input)
+            if await send_suggestions(message.channel, input, helper.all_name_to_id):
+                return
+
+            info = await Item(input, max_age=MAX_AGE['!m'])
             deliverable = item_message.deliverable(info)
             header = f"{info.enhancement_level.upper()}: {info.name}" if info.enhancement_level else info.name
             embed = discord.Embed(colour=discord.Colour.red(),
@@ -54,22 +123,46 @@ def run_discord_bot():
 
         elif "!r" in user_message:
             verbose = True if '!v' in user_message.lower() else False
+            sweep = '!s' in user_message
             mastery = 1000
-            clean_input = user_message.replace('!r', '').replace('!v', '').strip()
+            clean_input = user_message.replace('!r', '').replace('!v', '').replace('!s', '').strip()
             if clean_input.split(" ")[-1].isdigit():
                 mastery = int(clean_input.split(" ")[-1])
                 clean_input = ' '.join(clean_input.split(" ")[:-1])
 
-            info = Craftable(clean_input, mastery, verbose)
-            deliverable = craftable_message.deliverable(info)
+            if await send_suggestions(message.channel, clean_input, helper.craftable_name_to_id):
+                return
+
+            info = await Craftable(clean_input, mastery, verbose, max_age=MAX_AGE['!r'])
+            leaderboard.observe(info) # Keeps the leaderboard up to date with the prices just fetched
+            if sweep:
+                deliverable = sweep_message.deliverable(info)
+            else:
+                deliverable = craftable_message.deliverable(info, leaderboard.profit(info.name, mastery))
+            header = f"{info.enhancement_level.upper()}: {info.name}" if info.enhancement_level else info.name
+            embed = discord.Embed(colour=discord.Colour.red(),
+                                  description=deliverable,
+                                  title=f"{header} (Mastery Sweep)" if sweep else f"{header} (Recipe Info)")
+            
+            await message.channel.send(embed=embed)
+
+        elif "!h" in user_message:
+            input = user_message.replace('!h', '').strip()
+            if await send_suggestions(message.channel, input, helper.all_name_to_id):
+                return
+
+            info = await History(input)
+            deliverable = history_message.deliverable(info)
             header = f"{info.enhancement_level.upper()}: {info.name}" if info.enhancement_level else info.name
             embed = discord.Embed(colour=discord.Colour.red(),
                                   description=deliverable,
-                                  title=f"{header} (Recipe Info)")
+                                  title=f"{header} (Price History)")
             
             await message.channel.send(embed=embed)
 
         
     
+    recipe_store.start() # Recipes are loaded before the bot starts listening
+    pool.start() # Workers are started once, before the bot starts listening
     load_dotenv()
     client.run(os.getenv('TOKEN'))
\ No newline at end of file
@@ -0,0 +1,273 @@
+import asyncio
+import functools, math, os, pickle, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Union
+
+
+class MemoryBackend:
+    """
+    Entries of a cache in this process, with LRU eviction. The default backend of TTLCache.
+
+    PARAMS:
+    max_entries: Maximum number of entries kept. The least recently used entry is evicted first.
+    """
+    def __init__(self, max_entries: int=4096) -> None:
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (value, time stored)
+
+    async def get(self, key: Hashable) -> Union[tuple, None]:
+        '''
+        Returns (value, time stored) of key, or None if it is not stored.
+        '''
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: Hashable, value: Any, stored_at: float, expire_after: float) -> None:
+        '''
+        Stores value under key. Expired entries are not removed, they are evicted as the least recently used.
+        '''
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: Hashable, seconds: float) -> bool:
+        '''
+        Returns whether this process should refresh key. Always, as no other process uses these entries.
+        '''
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Entries of a cache in Redis, shared by every process of the bot (see main.py for sharded runs), so that an item
+    fetched by one shard is served to all of them. Values are pickled: only use a Redis that the bot alone writes to.
+    Entries expire in Redis once they are too old to be served, and Redis evicts by its own maxmemory policy.
+
+    Redis is called with a blocking client: read, write and acquire are for threads (e.g. recipes.RecipeStore), and
+    get, set and claim run them in a thread, so that the event loop never waits on Redis. If Redis fails or times out,
+    lookups miss and nothing is stored, and Redis is not called again for retry_after seconds.
+
+    PARAMS:
+    client: redis.Redis, or any client with the same interface, e.g. fakeredis.FakeRedis. It should have socket
+            timeouts, see get_redis_client.
+    namespace: Prefix of the keys of the cache
+    retry_after: Seconds for which Redis is skipped after it failed
+    """
+    def __init__(self, client, namespace: str, retry_after: float=30) -> None:
+        self.client = client
+        self.namespace = namespace
+        self.retry_after = retry_after
+        self.failures = 0
+        self._down_until = 0 # time.monotonic() until which Redis is skipped
+
+    async def get(self, key: Hashable) -> Union[tuple, None]:
+        '''
+        Returns (value, time stored) of key, or None if it is not stored or Redis is unavailable.
+        '''
+        return await asyncio.to_thread(self.read, key) if self.available() else None
+
+    async def set(self, key: Hashable, value: Any, stored_at: float, expire_after: float) -> None:
+        if self.available():
+            await asyncio.to_thread(self.write, key, value, stored_at, expire_after)
+
+    async def claim(self, key: Hashable, seconds: float) -> bool:
+        '''
+        Returns whether this process should refresh key: only the first process to ask in seconds does.
+        '''
+        return await asyncio.to_thread(self.acquire, key, seconds) if self.available() else True
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def read(self, key: Hashable) -> Union[tuple, None]:
+        try:
+            payload = self.client.get(self._key(key))
+        except Exception as e:
+            self._failed('read', key, e)
+            return None
+        return pickle.loads(payload) if payload is not None else None
+
+    def write(self, key: Hashable, value: Any, stored_at: float, expire_after: float) -> None:
+        payload = pickle.dumps((value, stored_at), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self.client.set(self._key(key), payload, ex=max(1, math.ceil(expire_after)))
+        except Exception as e:
+            self._failed('write', key, e)
+
+    def acquire(self, key: Hashable, seconds: float) -> bool:
+        try:
+            return bool(self.client.set(f"{self.namespace}-claim:{key!r}", 1, nx=True, ex=max(1, math.ceil(seconds))))
+        except Exception as e:
+            self._failed('claim', key, e)
+            return True
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.namespace}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key!r}"
+
+    def _failed(self, operation: str, key: Hashable, e: Exception) -> None:
+        self.failures += 1
+        self._down_until = time.monotonic() + self.retry_after
+        print(f"Failed to {operation} {key} in Redis, skipping Redis for {self.retry_after:.0f} s: {e!r}")
+
+
+@functools.cache
+def get_redis_client():
+    '''
+    Returns the Redis client at REDIS_URL, shared by every cache. Connecting and every command time out after
+    REDIS_TIMEOUT seconds, so that a Redis that hangs is treated as unavailable.
+    '''
+    import redis # Only needed with CACHE_BACKEND=redis
+    timeout = float(os.getenv('REDIS_TIMEOUT', 0.5))
+    return redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                                socket_connect_timeout=timeout, socket_timeout=timeout)
+
+def shared_backend(namespace: str) -> Union[RedisBackend, None]:
+    '''
+    Returns the backend of a cache shared between processes, selected by the CACHE_BACKEND env var: "redis" shares
+    entries through the Redis at REDIS_URL. Returns None with "memory" (default), which keeps entries in each process.
+    '''
+    backend = os.getenv('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return None
+    if backend == 'redis':
+        return RedisBackend(get_redis_client(), namespace)
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}, expected 'memory' or 'redis'")
+
+def cache_backend(namespace: str, max_entries: int=4096) -> Union[MemoryBackend, RedisBackend]:
+    '''
+    Returns the shared backend of a cache if there is one (see shared_backend), or a MemoryBackend of max_entries.
+    '''
+    backend = shared_backend(namespace)
+    return backend if backend is not None else MemoryBackend(max_entries)
+
+
+class TTLCache:
+    """
+    Cache of market responses with a time to live, LRU eviction and stale-while-revalidate.
+    Entries are stored in a backend, in this process by default (see MemoryBackend and RedisBackend). Entry times are
+    wall clock times, so that processes sharing a backend agree on their age.
+
+    PARAMS:
+    ttl: Seconds for which an entry is served as fresh
+    stale_ttl: Seconds after ttl for which an entry is still served, while a refresh runs in the background
+    max_entries: Maximum number of entries kept. The least recently used entry is evicted first.
+    backend: Where entries are stored. Defaults to a MemoryBackend of max_entries.
+    """
+    def __init__(self, ttl: float=60, stale_ttl: float=240, max_entries: int=4096,
+                 backend: Union[MemoryBackend, RedisBackend, None]=None) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None else MemoryBackend(max_entries)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._refreshing = {} # key -> background refresh task
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        '''
+        Returns the cached value of key.
+        Fresh entries are returned as is. Stale entries are returned as is, and a background refresh is started.
+        Otherwise, awaits fetch() and caches its result.
+        '''
+        entry = await self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+
+            if age < self.ttl:
+                self.hits += 1
+                return value
+
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._refreshing and await self.backend.claim(key, self.ttl):
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+                return value
+
+        self.misses += 1
+        value = await fetch()
+        await self.set(key, value)
+        return value
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        '''
+        Stores value under key, evicting the least recently used entries if the cache is full.
+        '''
+        await self.backend.set(key, value, time.time(), self.ttl + self.stale_ttl)
+
+    def stats(self) -> dict:
+        '''
+        Returns hit/miss counters, to be used for tuning ttl and max_entries.
+        '''
+        lookups = self.hits + self.stale_hits + self.misses
+        return {'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0,
+                'entries': len(self)}
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def __len__(self) -> int:
+        '''
+        Returns the number of entries held in this process. Entries of a shared backend are not counted.
+        '''
+        return len(self.backend) if isinstance(self.backend, MemoryBackend) else 0
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> None:
+        '''
+        Refetches a stale entry. If the refresh fails, the stale value is kept until it expires.
+        '''
+        try:
+            await self.set(key, await fetch())
+        except Exception as e:
+            print(f"Failed to refresh {key}: {e!r}")
+        finally:
+            del self._refreshing[key]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one call.
+    While a call for a key is in flight, every other caller asking for that key awaits the same result instead of
+    starting its own call.
+    """
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {} # key -> task of the call in flight
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        '''
+        Returns the result of fetch(), sharing it with every concurrent caller of the same key.
+        Exceptions are shared as well. A cancelled caller does not cancel the call for the others.
+        '''
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
@@ -0,0 +1,182 @@
+'''
+Expected output of a craft. The value of a craft is linear in the prices of the item and of its higher grade item:
+    value = reg_price * regular coefficient + rare_price * rare coefficient
+so the coefficients are computed once per item and mastery, and shared by single items (message.Craftable) and by the
+profit leaderboard (leaderboard.py).
+'''
+from typing import Union
+import numpy as np
+import helper
+
+
+def mastery_bracket(mastery: int) -> str:
+    '''
+    Gets the mastery bracket based on a number.
+    Mastery brackets range from 0 to 2000, at intervals of 50.
+    Returns str instead of int/float because MongoDB only allows str as keys.
+    '''
+    floor = 0
+    if mastery >= 2000:
+        mastery = 2000
+    elif mastery <= 0:
+        mastery = 0
+    else:
+        floor = mastery % 50
+    return str(float(mastery - floor))
+
+def cooking_rates(name: str, mastery: str) -> tuple[dict, dict]:
+    '''
+    Returns average cooking rates based on cooking mastery.
+    '''
+    return cooking_proc_rates(name), helper.cooking_mastery_dict[mastery]
+
+def cooking_proc_rates(name: str) -> dict:
+    '''
+    Returns the proc rates of cooking an item, which do not depend on mastery.
+    '''
+    name = name.lower()
+
+    # For items with proc exceptions
+    if name in helper.cooking_exceptions.keys():
+        return helper.cooking_exceptions[name]
+
+    return {'reg_base': 2.5, 'reg_mult': 1.5, 'rare_base': 1.5, 'rare_mult': 0.5, 'rare_proc_base_chance': 0.2}
+
+def alchemy_rates(name: str, mastery: str) -> tuple[dict, dict]:
+    '''
+    Returns average alchemy rates based on alchemy mastery.
+    '''
+    return alchemy_proc_rates(name), helper.alchemy_mastery_dict[mastery]
+
+def alchemy_proc_rates(name: str) -> dict:
+    '''
+    Returns the proc rates of brewing an item, which do not depend on mastery.
+    '''
+    name = name.lower()
+
+    # For items with different proc rates than the norm
+    if name in helper.alchemy_exceptions.keys():
+        return helper.alchemy_exceptions[name]
+
+    # For items that can only proc once per craft
+    elif 'perfume' in name or 'draught' in name or 'deep sea' in name or\
+        'indignation' in name or 'khalk' in name or 'sturdy whale tendon elixir' == name or\
+        'sturdy whale tendon potion' == name or 'elixir of regeneration' == name or\
+        ("party" in name and "harmony" in name):
+        return {'reg_base': 1, 'reg_mult': 0, 'rare_base': 0, 'rare_mult': 0}
+
+    return {'reg_base': 2.5, 'reg_mult': 1.5, 'rare_base': 0.3, 'rare_mult': 0}
+
+def cooking_coefficients(name: str, mastery: str) -> tuple[float, float]:
+    '''
+    Returns how many regular and rare items one cooking proc yields on average.
+    '''
+    rates, mastery_multiplers = cooking_rates(name, mastery)
+
+    reg_base_proc = rates['reg_base']
+    reg_additional_proc = rates['reg_mult']
+    reg_additional_proc_chance = mastery_multiplers["Regular Max Proc Chance"]
+
+    rare_base_proc = rates['rare_base']
+    rare_additional_proc = rates['rare_mult']
+    rare_additional_proc_chance = mastery_multiplers["Regular Max Proc Chance"]
+    rare_proc_base_chance = rates['rare_proc_base_chance']
+    rare_proc_additional_chance = mastery_multiplers['Rare Add. Chance']
+
+    return reg_base_proc + reg_additional_proc * reg_additional_proc_chance, \
+        (rare_base_proc + rare_additional_proc * rare_additional_proc_chance) * (rare_proc_base_chance + rare_proc_additional_chance)
+
+def alchemy_coefficients(name: str, mastery: str) -> tuple[float, float]:
+    '''
+    Returns how many regular and rare items one alchemy proc yields on average.
+    '''
+    rates, mastery_multiplers = alchemy_rates(name, mastery)
+
+    reg_base_proc = rates['reg_base']
+    reg_max_proc_multiplier = rates['reg_mult']
+    reg_max_proc_chance_multiplier = mastery_multiplers["Max Proc Chance"]
+
+    rare_base_proc = rates['rare_base']
+
+    return reg_base_proc + reg_max_proc_multiplier * reg_max_proc_chance_multiplier, rare_base_proc
+
+def value_coefficients(category: str, name: str, mastery: str) -> tuple[float, float]:
+    '''
+    Returns the regular and rare coefficients of the value of one craft of an item of category.
+    '''
+    if category == 'Food':
+        return cooking_coefficients(name, mastery)
+
+    elif 'elixir' in category.lower():
+        return alchemy_coefficients(name, mastery)
+
+    elif category == 'Material':
+        return 2.5, 0
+
+    return 1, 0
+
+def item_value(category: str, name: str, mastery: str, reg_price: Union[int, float], rare_price: Union[int, float]) -> Union[int, float]:
+    '''
+    Returns the value of one craft of an item, given its price and the price of its higher grade item.
+    '''
+    reg, rare = value_coefficients(category, name, mastery)
+    return reg_price * reg + rare_price * rare
+
+
+# Every mastery bracket, from 0 to 2000
+BRACKETS = tuple(mastery_bracket(mastery) for mastery in range(0, 2001, 50))
+
+_mastery_arrays = {} # (id of the mastery table, static version) -> {field: value at every bracket}
+
+def mastery_arrays(mastery_dict: dict) -> dict:
+    '''
+    Returns every field of a mastery table (cooking_mastery_dict or alchemy_mastery_dict) as an array over BRACKETS.
+    Computed once per table, and again when the static tables change.
+    '''
+    key = (id(mastery_dict), helper.static_version)
+    arrays = _mastery_arrays.get(key)
+    if arrays is None:
+        fields = mastery_dict[BRACKETS[0]].keys()
+        arrays = {field: np.array([mastery_dict[bracket][field] for bracket in BRACKETS], dtype=np.float64) for field in fields}
+        if len(_mastery_arrays) >= 8: # Tables of earlier static versions
+            _mastery_arrays.clear()
+        _mastery_arrays[key] = arrays
+    return arrays
+
+def coefficient_curves(category: str, name: str) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns value_coefficients of an item at every bracket of BRACKETS, as two arrays.
+    '''
+    if category == 'Food':
+        rates, mastery_multiplers = cooking_proc_rates(name), mastery_arrays(helper.cooking_mastery_dict)
+        regular = rates['reg_base'] + rates['reg_mult'] * mastery_multiplers["Regular Max Proc Chance"]
+        rare = (rates['rare_base'] + rates['rare_mult'] * mastery_multiplers["Regular Max Proc Chance"]) * \
+            (rates['rare_proc_base_chance'] + mastery_multiplers['Rare Add. Chance'])
+        return regular, rare
+
+    elif 'elixir' in category.lower():
+        rates, mastery_multiplers = alchemy_proc_rates(name), mastery_arrays(helper.alchemy_mastery_dict)
+        regular = rates['reg_base'] + rates['reg_mult'] * mastery_multiplers["Max Proc Chance"]
+        return regular, np.full(len(BRACKETS), float(rates['rare_base']))
+
+    regular, rare = value_coefficients(category, name, BRACKETS[0])
+    return np.full(len(BRACKETS), float(regular)), np.full(len(BRACKETS), float(rare))
+
+def value_curve(category: str, name: str, reg_price: Union[int, float], rare_price: Union[int, float]) -> np.ndarray:
+    '''
+    Returns item_value at every bracket of BRACKETS.
+    '''
+    regular, rare = coefficient_curves(category, name)
+    return reg_price * regular + rare_price * rare
+
+def break_even(profits: np.ndarray) -> Union[int, None]:
+    '''
+    Returns the lowest mastery from which profits (at every bracket of BRACKETS) are never negative again, or None if
+    the profit at 2000 mastery is negative.
+    '''
+    losses = np.flatnonzero(profits < 0)
+    if not len(losses):
+        return 0
+    if losses[-1] == len(BRACKETS) - 1:
+        return None
+    return int(float(BRACKETS[losses[-1] + 1]))
@@ -0,0 +1,144 @@
+'''
+Local price history of market items, stored in SQLite.
+Every snapshot of an enhancement level is downsampled into one ring buffer per resolution, so that the store has a
+fixed size per item however long the bot runs: the snapshot of a time bucket overwrites the slot of the bucket one
+ring earlier.
+'''
+import os, sqlite3, threading, time
+from typing import NamedTuple, Union
+from helper import CACHE_DIR
+
+
+DAILY = 86400
+
+# Seconds between market passes (see prices.MarketPoller): finer buckets would leave most of their slots empty
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', 600))
+FINEST = max(int(POLL_INTERVAL), 1)
+
+# Seconds per time bucket -> number of buckets kept
+RESOLUTIONS = {
+    FINEST: max(DAILY // FINEST, 1), # One bucket per pass, for a day
+    **{resolution: capacity for resolution, capacity in {
+        3600: 336, # Hourly, for two weeks
+        DAILY: 365, # Daily, for a year
+        }.items() if resolution >= FINEST},
+    }
+
+HISTORY_PATH = os.path.join(CACHE_DIR, 'history.sqlite3')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER NOT NULL,
+    sid INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    base_price INTEGER,
+    current_stock INTEGER,
+    total_trades INTEGER,
+    last_sold_price INTEGER,
+    PRIMARY KEY (id, sid, resolution, slot)
+) WITHOUT ROWID
+'''
+
+
+class HistoryPoint(NamedTuple):
+    '''
+    Market data of an enhancement level in a time bucket: the last snapshot recorded in the bucket, time being the
+    start of the bucket. Backfilled points only have a base price.
+    '''
+    time: int
+    base_price: Union[int, None]
+    current_stock: Union[int, None]
+    total_trades: Union[int, None]
+    last_sold_price: Union[int, None]
+
+
+class PriceHistory:
+    """
+    Ring buffers of market snapshots per (id, sid, resolution).
+
+    PARAMS:
+    path: SQLite database file. ":memory:" keeps the history in memory only.
+    resolutions: Seconds per time bucket -> number of buckets kept
+    """
+    def __init__(self, path: str=HISTORY_PATH, resolutions: dict=RESOLUTIONS) -> None:
+        self.path = path
+        self.resolutions = resolutions
+        self._connection = None
+        # The connection is shared by threads: the poller records passes in one, and reads run in others (see
+        # item.History), so that the event loop never waits on the lock
+        self._lock = threading.Lock()
+
+    def record(self, entries: list, timestamp: Union[int, None]=None) -> None:
+        '''
+        Records (sid, SubListEntry) pairs taken at timestamp (now by default) in every resolution, in one transaction.
+        '''
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        rows = []
+        for resolution, capacity in self.resolutions.items():
+            bucket = timestamp // resolution
+            for sid, entry in entries:
+                rows.append((entry.id, sid, resolution, bucket % capacity, bucket * resolution, entry.base_price,
+                             entry.current_stock, entry.total_trades, entry.last_sold_price))
+
+        with self._lock, self._connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def backfill(self, id: int, sid: int, daily_prices: list, timestamp: Union[int, None]=None) -> None:
+        '''
+        Records daily prices from GetMarketPriceInfo (oldest first, the last one being today's) as daily base prices.
+        Days that already have a recorded snapshot are kept as is.
+        '''
+        resolution = DAILY
+        if resolution not in self.resolutions:
+            return
+        capacity = self.resolutions[resolution]
+        today = (int(time.time()) if timestamp is None else timestamp) // resolution
+        days = range(today - len(daily_prices) + 1, today + 1)
+        rows = [(id, sid, resolution, day % capacity, day * resolution, price, None, None, None)
+                for day, price in zip(days, daily_prices) if day > today - capacity]
+
+        with self._lock, self._connect() as connection:
+            connection.executemany('DELETE FROM history WHERE id = ? AND sid = ? AND resolution = ? AND slot = ? AND time < ?',
+                                   [row[:5] for row in rows]) # Slots of a previous ring
+            connection.executemany('INSERT OR IGNORE INTO history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def series(self, id: int, sid: int, resolution: int, timestamp: Union[int, None]=None) -> list:
+        '''
+        Returns the HistoryPoints of (id, sid) at resolution, oldest first. Points from before the current ring are skipped.
+        '''
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        oldest = (timestamp // resolution - self.resolutions[resolution] + 1) * resolution
+        with self._lock:
+            rows = self._connect().execute('SELECT time, base_price, current_stock, total_trades, last_sold_price '
+                                           'FROM history WHERE id = ? AND sid = ? AND resolution = ? AND time >= ? '
+                                           'ORDER BY time', (id, sid, resolution, oldest)).fetchall()
+        return [HistoryPoint._make(row) for row in rows]
+
+    def all_series(self, id: int, sid: int, timestamp: Union[int, None]=None) -> dict:
+        '''
+        Returns the series of (id, sid) at every resolution, resolution -> HistoryPoints, see series.
+        '''
+        return {resolution: self.series(id, sid, resolution, timestamp) for resolution in self.resolutions}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        '''
+        Returns the connection to the database, opening it and creating the table on first use. Callers hold the lock.
+        '''
+        if self._connection is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(SCHEMA)
+        return self._connection
+
+
+price_history = PriceHistory()
@@ -1,111 +1,186 @@
 from helper import *
 from search import *
+from market import market
+from cache import shared_backend
+from parsers import SubListEntry, BiddingInfo
+from snapshot import MarketSnapshot
+from recipes import RecipeStore, ResolvedRecipe, VENDOR, DROP, RECIPES_SNAPSHOT_PATH
+from prices import price_table
+from profiles import enhancement_profiles
+from history import price_history, DAILY
+from crafting import mastery_bracket
+from solver import CraftingSolver, market_ingredients
+from workers import pool
 from typing import Union
+import asyncio
+import helper
 
 search = Search()
+recipe_store = RecipeStore(helper.items, search.is_market_item, backend=shared_backend('craftable_items'),
+                           snapshot_path=RECIPES_SNAPSHOT_PATH)
 
 class Item:
     """
     An item that's in the market.
     """
 
-    def __init__(self, user_input: Union[str, None], exact: bool=False, data: dict=all_name_to_id) -> None:
+    def __init__(self, user_input: Union[str, None], exact: bool=False, data: Union[dict, None]=None,
+                 max_age: Union[float, None]=None, bidding: bool=True) -> None:
+        '''
+        Reads the enhancement level from user input. The item is only found, and its market data fetched, once the
+        item is awaited:
+        >>>info = await Item("blackstar vediant")
 
-        if not user_input:
-            self.name = None
+        PARAMS:
+        max_age: Seconds for which market data polled into prices.price_table is used instead of asking the trade market.
+                 None never uses the price table.
+        bidding: Whether to fetch the price ladder (listings and buy orders) of the item
+        data: Name -> id table to find the item in, helper.all_name_to_id by default
+        '''
+        self.max_age = max_age
+        self.bidding = bidding
+        self.name = None
+        self._query = None
 
-        else:
+        if user_input:
             self.enhancement_level = search.get_enhancement_level(user_input)
-            search_result = search.find_item(user_input, exact, data)
-            print(search_result)
+            self._query = (user_input, exact, data)
+
+    def __await__(self):
+        return self.load().__await__()
+
+    async def find(self) -> None:
+        '''
+        Finds the item from user input, in a worker process if the worker pool is started. Does nothing once it is found.
+        '''
+        if self._query is None:
+            return
+        user_input, exact, data = self._query
+        self._query = None
+        data = data if data is not None else helper.all_name_to_id
+        search_result = await pool.find_item(search, user_input, exact, data)
+        print(search_result)
+
+        self.id = list(search_result.keys())[0]
+        self.name = list(search_result.values())[0]
+
+    async def load(self) -> 'Item':
+        '''
+        Fetches market data of the item. Returns itself so that the item can be awaited on construction.
+        '''
+        await self.find()
+        if not self.name:
+            return self
 
-            self.id = list(search_result.keys())[0]
-            self.name = list(search_result.values())[0]
+        sublist_response = price_table.get_sub_list(self.id, self.max_age) if self.max_age is not None else None
+        bidding_info, bidding_sid = None, None
+        if sublist_response is None:
+            sublist_response, bidding_info, bidding_sid = await self._fetch_sub_list()
+        self.sid = search.get_sid(sublist_response, self.enhancement_level)
 
-            sublist_response = get_world_market_sub_list(self.id)
-            self.sid = search.get_sid(sublist_response, self.enhancement_level)
+        market_data = self._extract_market_data(sublist_response)
+        self.current_stock = market_data.current_stock
+        self.base_price = market_data.base_price
+        self.price_max = market_data.price_max
+        self.price_min = market_data.price_min
+        self.last_sold_price = market_data.last_sold_price
+        self.price = market_data.last_sold_price
+        self.last_sold_time = datetime_formatted(market_data.last_sold_time)
 
-            market_data = self._extract_market_data(sublist_response)
-            self.current_stock = market_data['currentStock']
-            self.base_price = market_data['basePrice']
-            self.price_max = market_data['priceMax']
-            self.price_min = market_data['priceMin']
-            self.last_sold_price = market_data['lastSoldPrice']
-            self.price = market_data['lastSoldPrice']
-            self.last_sold_time = datetime_formatted(market_data['lastSoldTime'])
-            self.bidding_info = self._extract_bidding_info()
+        if self.bidding and bidding_sid != self.sid: # Not fetched yet, or fetched for a mispredicted sid
+            bidding_info = await market.get_bidding_info_list(self.id, self.sid)
+        self.snapshot = MarketSnapshot(self.sid, market_data, bidding_info)
+        return self
 
-    def _extract_market_data(self, response: list) -> dict:
+    async def _fetch_sub_list(self) -> tuple[list, Union[BiddingInfo, None], Union[int, None]]:
         '''
-        Takes response and puts data into a dictionary.
+        Fetches the sublist of the item. If the bidding info is needed and its sid can be resolved without the sublist
+        (no enhancement level, or a sublist length known to profiles.enhancement_profiles), the bidding info is fetched
+        concurrently instead of after the sublist.
+        Returns the sublist, and the bidding info and the sid it was fetched for, or None for both.
         '''
-        data = response[self.sid]
-        components = data.split('-')
-        item = {}
-        for i, info in enumerate(components):
-            item[response_data_structure[str(i)]] = int(info)
-        return item
+        length = enhancement_profiles.get(self.id) if self.bidding and self.enhancement_level is not None else None
+        if not self.bidding or (self.enhancement_level is not None and length is None):
+            sublist_response = await market.get_world_market_sub_list(self.id)
+            bidding_info, bidding_sid = None, None
+        else:
+            bidding_sid = search.sid_from_length(length, self.enhancement_level)
+            sublist_response, bidding_info = await asyncio.gather(market.get_world_market_sub_list(self.id),
+                                                                  market.get_bidding_info_list(self.id, bidding_sid))
+        enhancement_profiles.learn(self.id, len(sublist_response))
+        return sublist_response, bidding_info, bidding_sid
 
-    def _extract_bidding_info(self) -> list:
+    def _extract_market_data(self, response: list) -> SubListEntry:
         '''
-        Performs API call and puts data into a list.
+        Returns the sublist entry of the enhancement level of the item.
         '''
-        bidding_info_response = get_bidding_info_list(self.id, self.sid)
-        bidding_info = []
-        for el in bidding_info_response:
-            price_point = el.split('-')
-            d = {'price': int(price_point[0]),
-                'sellers': int(price_point[1]), 
-                'buyers': int(price_point[2])}
-            bidding_info.append(d)
-        return bidding_info
+        return response[self.sid]
 
 
 class Craftable(Item):
 
-    def __init__(self, user_input: str, mastery: int, verbose: bool) -> None:
+    def __init__(self, user_input: str, mastery: int, verbose: bool, max_age: Union[float, None]=None) -> None:
 
-        Item.__init__(self, user_input, data=craftable_name_to_id)
+        Item.__init__(self, user_input, data=helper.craftable_name_to_id, max_age=max_age)
+        self.mastery = self._mastery_bracket(mastery)
+        self.verbose = verbose
+
+    async def load(self) -> 'Craftable':
+        '''
+        Fetches market data of the item, its higher grade item and the ingredients of all of its recipes.
+        All lookups are gathered concurrently; MarketClient bounds how many requests are in flight.
+        '''
+        await self.find()
+        await asyncio.gather(Item.load(self), self._load_recipes(), self._load_crafting_tree())
+        return self
 
-        query = {'name': self.name}
-        data = items.find(query)[0]
-        self.category = data['category']
+    async def _load_recipes(self) -> None:
+        '''
+        Gets the recipes of the item from the recipe store, then fetches the higher grade item and every ingredient concurrently.
+        '''
+        data = recipe_store.get(self.name)
+        self.category = data.category
         
-        self.higher_grade = Item(data['higher_grade'], exact=True)
+        self.higher_grade = Item(data.higher_grade, exact=True, max_age=self.max_age, bidding=False)
 
-        recipes = data['all_recipes']
         self.recipes = {}
         self.substitutions = {}
-        for recipe_number, recipe in recipes.items():
-            recipe_object = Recipe(recipe)
+        for recipe_number, recipe in data.recipes.items():
+            recipe_object = Recipe(recipe, self.max_age)
             self.recipes[recipe_number] = recipe_object
             for ingredient, substitution in recipe_object.subsitutions.items():
                 self.substitutions[ingredient] = substitution
 
-        self.mastery = self._mastery_bracket(mastery)
-        self.verbose = verbose
+        await asyncio.gather(self.higher_grade.load(), *(recipe.load() for recipe in self.recipes.values()))
+
+    async def _load_crafting_tree(self) -> None:
+        '''
+        Fetches the price of every market item in the recipe graph below the item in one concurrent pass, then finds
+        the cheapest way to craft it, buying or crafting every ingredient, see solver.CraftingSolver.
+        '''
+        recipes = recipe_store.all()
+        names = sorted(market_ingredients(recipes, self.name))
+        ingredients = [Item(name, exact=True, max_age=self.max_age, bidding=False) for name in names]
+        await asyncio.gather(*(ingredient.load() for ingredient in ingredients))
+
+        self.solver = CraftingSolver(recipes, {name: ingredient.price for name, ingredient in zip(names, ingredients)})
+        self.tree = self.solver.tree(self.name, self.mastery)
 
     def _mastery_bracket(self, mastery: int) -> str:
         '''
-        Gets the mastery bracket based on a number.
-        Mastery brackets range from 0 to 2000, at intervals of 50.
-        Returns str instead of int/float because MongoDB only allows str as keys.
+        Gets the mastery bracket based on a number, see crafting.mastery_bracket.
         '''
-        floor = 0
-        if mastery >= 2000:
-            mastery = 2000
-        elif mastery <= 0:
-            mastery = 0
-        else:
-            floor = mastery % 50
-        return str(float(mastery - floor))
+        return mastery_bracket(mastery)
     
     
 class Vendor(Item):
 
     def __init__(self, input: str) -> None:
         self.name = input
-        self.price = static_items[self.name]
+        self.price = helper.static_items[self.name]
+
+    async def load(self) -> 'Vendor':
+        return self
 
     def deliverable(self) -> str:
         return f"Item: {self.name}\nVendor price: {self.price}"
@@ -116,35 +191,69 @@ class Drop(Item):
         self.name = input
         self.price = 0
 
+    async def load(self) -> 'Drop':
+        return self
+
     def deliverable(self) -> str:
         return f"Item: {self.name}\nOnly obtained as loot."
 
+class History(Item):
+    """
+    Recorded price history of an item, see history.PriceHistory.
+    """
+
+    BACKFILL_BELOW = 7 # Daily points recorded, below which the daily history is backfilled from the trade market
+
+    async def load(self) -> 'History':
+        '''
+        Reads the price history of every resolution. The sublist is only needed to resolve an enhancement level, and is
+        taken from the price table if it is there. The daily history is backfilled once with GetMarketPriceInfo.
+        '''
+        await self.find()
+        if not self.name:
+            return self
+
+        sublist_response = []
+        if self.enhancement_level is not None:
+            sublist_response = price_table.get_sub_list(self.id, float('inf')) or await market.get_world_market_sub_list(self.id)
+        self.sid = search.get_sid(sublist_response, self.enhancement_level)
+
+        # SQLite is read in a thread: the poller holds the history lock while it records a pass
+        if len(await asyncio.to_thread(price_history.series, self.id, self.sid, DAILY)) < self.BACKFILL_BELOW:
+            daily_prices = await market.get_market_price_info(self.id, self.sid)
+            await asyncio.to_thread(price_history.backfill, self.id, self.sid, daily_prices)
+
+        self.series = await asyncio.to_thread(price_history.all_series, self.id, self.sid)
+        return self
+
+
 class Recipe:
     
-    def __init__(self, recipe: dict) -> None:
+    def __init__(self, recipe: ResolvedRecipe, max_age: Union[float, None]=None) -> None:
+        '''
+        Creates the ingredients of a recipe resolved by the recipe store.
+        Only the prices of ingredients are needed, so their price ladders are not fetched. See Item for max_age.
+        '''
         self.recipe = {}
-        self.subsitutions = {}
-        for ingredient in recipe:
-            quantity = recipe[ingredient]
-            if ingredient in special:
-                ingredient = special[ingredient]
-
-            if ingredient in substitutions:
-                self.subsitutions[ingredient] = substitutions[ingredient]
-                ingredient = substitutions[ingredient][0]
-
-            if ingredient in static_items:
-                ingredient_item = Vendor(ingredient)
-                self.recipe[ingredient_item] = quantity
-                continue
+        self.subsitutions = dict(recipe.substitutions)
+        for ingredient in recipe.ingredients:
+            if ingredient.kind == VENDOR:
+                ingredient_item = Vendor(ingredient.name)
+            elif ingredient.kind == DROP:
+                ingredient_item = Drop(ingredient.name)
+            else:
+                ingredient_item = Item(ingredient.name, exact=True, max_age=max_age, bidding=False)
+            self.recipe[ingredient_item] = ingredient.quantity
 
-            if ingredient.lower() not in [name.lower() for name in all_name_to_id]:
-                ingredient_item = Drop(ingredient)
-                self.recipe[ingredient_item] = quantity
-                continue
+    def __await__(self):
+        return self.load().__await__()
 
-            ingredient_item = Item(ingredient, exact=True)
-            self.recipe[ingredient_item] = int(quantity)
+    async def load(self) -> 'Recipe':
+        '''
+        Fetches market data of every ingredient in the recipe concurrently.
+        '''
+        await asyncio.gather(*(ingredient.load() for ingredient in self.recipe))
+        return self
 
     def __str__(self) -> str:
         result = ""
@@ -156,7 +265,7 @@ if __name__ == "__main__":
     search = Search()
     input = "elixir death"
     exact = False
-    data = all_name_to_id
+    data = helper.all_name_to_id
     print(search.find_item(input, exact, data))
 
     
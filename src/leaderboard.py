@@ -0,0 +1,114 @@
+'''
+Profit leaderboard of every craftable item, ranked by a ProfitEngine (see profit.py) with polled prices.
+'''
+import numpy as np
+from typing import Callable, Union
+import helper
+import crafting
+from recipes import RecipeStore
+from prices import PriceTable, price_table
+from item import recipe_store
+from workers import pool
+from profit import Profit, ProfitMatrix, ProfitEngine, build_engine, market_id, craftable_id
+
+
+CATEGORIES = {
+    'food': lambda category: category == 'Food',
+    'elixir': lambda category: 'elixir' in category.lower(),
+    'material': lambda category: category == 'Material',
+    }
+
+
+class Leaderboard:
+    """
+    Ranks every craftable item by margin, with prices from the price table. Items are only ranked once the poller (or
+    an !r, see observe) has priced them: ranking never fetches prices, which would take a request per item.
+    Results are kept in a ProfitEngine, which only recomputes what changed prices affect. The matrix and engine are
+    built by load_engine, again whenever the recipes or static tables changed, in a worker process if the worker pool
+    is started. Nothing builds them on the event loop thread: until load_engine has built one, there are no results.
+
+    PARAMS:
+    store: Recipes of every craftable item
+    market_id: Returns the id of a market item name, or None if it is not in the market
+    craftable_id: Returns the id of a craftable item name, or None if it is not in the market
+    table: Polled prices
+    """
+    def __init__(self, store: RecipeStore, market_id: Callable[[str], Union[int, None]],
+                 craftable_id: Callable[[str], Union[int, None]], table: PriceTable=price_table) -> None:
+        self.store = store
+        self.market_id = market_id
+        self.craftable_id = craftable_id
+        self.table = table
+        self._engine = None
+        self._matrix_version = None # (recipe store changes, static version) the matrix was built with
+
+    async def load_engine(self) -> ProfitEngine:
+        '''
+        Returns the engine of the current recipes and static tables, building it with the prices of the previous engine
+        if there is none yet or they changed. The engine is built in a worker process if the worker pool is started:
+        market_id and craftable_id must then be module level functions of a module without import side effects, see
+        profit.py.
+        '''
+        recipes = self.store.all()
+        version = (self.store.changes, helper.static_version)
+        if self._engine is None or self._matrix_version != version:
+            self._engine = await pool.run(build_engine, recipes, self.market_id, self.craftable_id, self._known_prices())
+            self._matrix_version = version
+        return self._engine
+
+    async def top(self, category: Union[str, None]=None, mastery: int=1000, max_age: float=float('inf'),
+                  limit: Union[int, None]=10) -> tuple[list, int]:
+        '''
+        Returns the limit craftable items of category (food, elixir, material or None for all) with the best margin at
+        mastery, and the number of items of category that are not ranked for lack of prices.
+        '''
+        engine = await self.load_engine()
+        engine.update_prices(self.prices(engine.matrix, max_age))
+        bracket, category = crafting.mastery_bracket(mastery), CATEGORIES.get(category)
+        return engine.rank(bracket, category, limit), engine.unpriced(bracket, category)
+
+    def profit(self, name: str, mastery: int) -> Union[Profit, None]:
+        '''
+        Returns the latest computed Profit of the craftable item name at mastery, or None if it has no price yet or the
+        engine of the current recipes and static tables was not built yet.
+        '''
+        if self._engine is None or self._matrix_version != (self.store.changes, helper.static_version):
+            return None
+        return self._engine.profit(name, crafting.mastery_bracket(mastery))
+
+    def observe(self, item) -> None:
+        '''
+        Applies the prices fetched by a loaded item.Craftable (the item, its higher grade item and market ingredients).
+        Does nothing until load_engine has built an engine.
+        '''
+        if self._engine is None:
+            return
+        prices = {item.id: item.last_sold_price}
+        if item.higher_grade.name:
+            prices[item.higher_grade.id] = item.higher_grade.last_sold_price
+        for recipe in item.recipes.values():
+            prices.update((ingredient.id, ingredient.price) for ingredient in recipe.recipe if hasattr(ingredient, 'id'))
+        self._engine.update_prices(prices)
+
+    def _known_prices(self) -> dict:
+        '''
+        Returns market id -> price of every price the current engine holds, to carry them over to a new engine.
+        '''
+        if self._engine is None:
+            return {}
+        return {id: self._engine.prices[column] for id, column in self._engine.matrix.market_columns.items()
+                if not np.isnan(self._engine.prices[column])}
+
+    def prices(self, matrix: ProfitMatrix, max_age: float) -> dict:
+        '''
+        Returns id -> last sold price of every market item of the matrix that the price table holds a price of at most
+        max_age seconds old. Other items keep the price the engine has, if any.
+        '''
+        prices = {}
+        for id in matrix.market_ids:
+            entry = self.table.get(id, 0, max_age) if id is not None else None
+            if entry is not None:
+                prices[id] = entry.last_sold_price
+        return prices
+
+leaderboard = Leaderboard(recipe_store, market_id, craftable_id)
@@ -1,6 +1,68 @@
-import bot
+'''
+Runs the bot. Without arguments, one process holds one gateway connection. Sharded runs:
+    python main.py --sharded                          One process, as many shards as Discord recommends
+    python main.py --shard-count 8 --processes 2      Shards 0-3 and 4-7 in two processes
+    python main.py --shard-count 8 --shard-ids 4-7    Only shards 4 to 7, e.g. on another host
+Processes of a sharded bot should share their caches, with CACHE_BACKEND=redis (see cache.shared_backend).
+'''
+import argparse, multiprocessing, os
 
 #Invite link https://discord.com/oauth2/authorize?client_id=1232481937248227409&permissions=1084479764544&scope=bot
 
+
+def shard_range(text: str) -> list:
+    '''
+    Parses shard ids given as "4-7" or "4,5,6,7".
+    '''
+    if '-' in text:
+        first, last = map(int, text.split('-'))
+        return list(range(first, last + 1))
+    return [int(shard_id) for shard_id in text.split(',')]
+
+def split_shards(shard_ids: list, processes: int) -> list:
+    '''
+    Splits shard ids into contiguous ranges, one per process.
+    '''
+    size, extra = divmod(len(shard_ids), processes)
+    ranges, start = [], 0
+    for process in range(processes):
+        end = start + size + (process < extra)
+        ranges.append(shard_ids[start:end])
+        start = end
+    return ranges
+
+def run(sharded: bool, shard_ids: list, shard_count: int, poll: bool) -> None:
+    import bot # Not imported by worker processes, which import this module on start (see workers.py)
+    bot.run_discord_bot(sharded, shard_ids, shard_count, poll)
+
+
 if __name__ == "__main__":
-    bot.run_discord_bot()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BDO market bot")
+    parser.add_argument('--sharded', action='store_true', help="Connect through AutoShardedClient")
+    parser.add_argument('--shard-count', type=int, help="Total number of shards of the bot")
+    parser.add_argument('--shard-ids', type=shard_range, help="Shards to connect, e.g. 0-3. Requires --shard-count.")
+    parser.add_argument('--processes', type=int, default=1, help="Processes to split the shards between")
+    parser.add_argument('--no-poll', action='store_true', help="Do not poll the market, another host does")
+    args = parser.parse_args()
+
+    if (args.shard_ids is not None or args.processes > 1) and args.shard_count is None:
+        parser.error("--shard-ids and --processes require --shard-count")
+
+    shard_ids = args.shard_ids
+    if args.processes > 1:
+        shard_ids = shard_ids if shard_ids is not None else list(range(args.shard_count))
+        if args.processes > len(shard_ids):
+            parser.error("--processes is larger than the number of shards")
+        if os.getenv('CACHE_BACKEND', 'memory') == 'memory':
+            print("CACHE_BACKEND is not set, every process keeps its own caches")
+
+        # Only the first process polls the market, the others load every pass it publishes (see prices.MarketPoller)
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=run, args=(True, ids, args.shard_count, process == 0 and not args.no_poll))
+                     for process, ids in enumerate(split_shards(shard_ids, args.processes))]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    else:
+        run(args.sharded, shard_ids, args.shard_count, not args.no_poll)
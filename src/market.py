@@ -0,0 +1,141 @@
+import asyncio
+from array import array
+from typing import Callable, Union
+from parsers import parse_world_market_sub_list, parse_bidding_info_list, parse_world_market_list, parse_market_price_info,\
+    BiddingInfo
+from cache import TTLCache, SingleFlight, MemoryBackend, RedisBackend, cache_backend
+from session import MarketSession
+from workers import pool
+
+
+class MarketClient:
+    """
+    Async client for the BDO trade market API.
+    Awaitable counterparts of helper.get_world_market_sub_list and helper.get_bidding_info_list, so that
+    market lookups do not block the Discord event loop.
+
+    Responses are cached by (id) for sublists and by (id, sid) for bidding info, see cache.TTLCache. The caches are
+    shared with the other processes of the bot if CACHE_BACKEND is set, see cache.shared_backend.
+    Concurrent lookups of the same uncached response share one upstream request, see cache.SingleFlight.
+    Large responses are parsed in a worker process, see workers.WorkerPool.parse.
+
+    PARAMS:
+    max_concurrency: Maximum number of requests in flight at once, shared by every command
+    cache_ttl: Seconds for which a cached response is served as fresh
+    cache_stale_ttl: Seconds after cache_ttl for which a cached response is served while it is refreshed in the background
+    cache_max_entries: Maximum number of cached responses per endpoint
+    session: Pooled HTTP session to send requests through
+    backend: Returns the backend of a cache, given its namespace and max entries
+    """
+    def __init__(self, max_concurrency: int=16, cache_ttl: float=60, cache_stale_ttl: float=240, cache_max_entries: int=4096,
+                 session: MarketSession=None, backend: Callable[[str, int], Union[MemoryBackend, RedisBackend]]=cache_backend) -> None:
+        self.session = session if session is not None else MarketSession()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.sub_list_cache = TTLCache(cache_ttl, cache_stale_ttl, cache_max_entries,
+                                       backend('GetWorldMarketSubList', cache_max_entries))
+        self.bidding_info_cache = TTLCache(cache_ttl, cache_stale_ttl, cache_max_entries,
+                                           backend('GetBiddingInfoList', cache_max_entries))
+        self.in_flight = SingleFlight()
+
+    async def get_world_market_sub_list(self, id: int) -> list:
+        '''
+        Gets the BDO world market sublist of item based on item id.
+        See helper.get_world_market_sub_list for the response layout.
+        '''
+        return await self.sub_list_cache.get_or_fetch((id,), lambda: self._fetch_world_market_sub_list(id))
+
+    async def get_bidding_info_list(self, id: int, sid: int) -> BiddingInfo:
+        '''
+        Gets the BDO bidding info list on the item based on the id and sid of the item.
+        See helper.get_bidding_info_list for the response layout.
+        '''
+        return await self.bidding_info_cache.get_or_fetch((id, sid), lambda: self._fetch_bidding_info_list(id, sid))
+
+    async def get_world_market_list(self, main_category: int, sub_category: int) -> list:
+        '''
+        Gets every item of a market category, as MarketListEntry. Not cached, it is only used by the market poller.
+        '''
+        payload = {
+        "keyType": 0,
+        "mainCategory": main_category,
+        "subCategory": sub_category
+        }
+        response = await self._post('GetWorldMarketList', payload)
+        return await pool.parse(parse_world_market_list, response)
+
+    async def get_market_price_info(self, id: int, sid: int) -> array:
+        '''
+        Gets the daily price history of an item, oldest first. Not cached, it is only used to backfill history.PriceHistory.
+        '''
+        return await self.in_flight.do(('GetMarketPriceInfo', id, sid), lambda: self._request_market_price_info(id, sid))
+
+    async def refresh_world_market_sub_list(self, id: int) -> list:
+        '''
+        Fetches the sublist of an item from the trade market, bypassing the cache, and caches the result.
+        '''
+        sub_list = await self._fetch_world_market_sub_list(id)
+        await self.sub_list_cache.set((id,), sub_list)
+        return sub_list
+
+    def cache_stats(self) -> dict:
+        '''
+        Returns the hit/miss counters of the response caches, and how many upstream requests were coalesced.
+        '''
+        return {'GetWorldMarketSubList': self.sub_list_cache.stats(),
+                'GetBiddingInfoList': self.bidding_info_cache.stats(),
+                'single_flight': self.in_flight.stats()}
+
+    def connection_stats(self) -> dict:
+        '''
+        Returns per endpoint connection reuse counters of the HTTP session.
+        '''
+        return self.session.stats()
+
+    async def _fetch_world_market_sub_list(self, id: int) -> list:
+        return await self.in_flight.do(('GetWorldMarketSubList', id), lambda: self._request_world_market_sub_list(id))
+
+    async def _fetch_bidding_info_list(self, id: int, sid: int) -> BiddingInfo:
+        return await self.in_flight.do(('GetBiddingInfoList', id, sid), lambda: self._request_bidding_info_list(id, sid))
+
+    async def _request_world_market_sub_list(self, id: int) -> list:
+        payload = {
+        "keyType": 0,
+        "mainKey": id
+        }
+        response = await self._post('GetWorldMarketSubList', payload)
+        return await pool.parse(parse_world_market_sub_list, response)
+
+    async def _request_bidding_info_list(self, id: int, sid: int) -> BiddingInfo:
+        payload = {
+        "keyType": 0,
+        "mainKey": id,
+        "subKey": sid
+        }
+        response = await self._post('GetBiddingInfoList', payload)
+        return await pool.parse(parse_bidding_info_list, response)
+
+    async def _request_market_price_info(self, id: int, sid: int) -> array:
+        payload = {
+        "keyType": 0,
+        "mainKey": id,
+        "subKey": sid
+        }
+        response = await self._post('GetMarketPriceInfo', payload)
+        return await pool.parse(parse_market_price_info, response)
+
+    async def close(self) -> None:
+        '''
+        Closes the underlying HTTP session.
+        '''
+        await self.session.close()
+
+    async def _post(self, endpoint: str, payload: dict) -> bytes:
+        '''
+        POSTs payload to a trade market endpoint and returns the raw response body.
+        At most max_concurrency requests are sent at once, the rest wait for a free slot.
+        '''
+        async with self._semaphore:
+            return await self.session.post(endpoint, payload)
+
+
+market = MarketClient()
@@ -1,6 +1,9 @@
 
-from item import Item, Craftable
-from helper import cooking_mastery_dict, cooking_exceptions,alchemy_mastery_dict, alchemy_exceptions
+from item import Item, Craftable, History
+import crafting
+import numpy as np
+from solver import Step, CRAFT, BUY
+from profit import Profit
 from typing import Union
 
 class Message:
@@ -45,37 +48,97 @@ class Item(Message):
         '''
         Returns the minimum price that the item is listed at, and the quantity (if they exist).
         '''
-        compare_price_listed = item.price_max # Price to compare to
-        min_list_price = None # Lowest price in which the item is available, if it exists
-        min_list_count = None # Quantity available at lowest price, if it exists
-
-        compare_price_bid = item.price_min # Price to compare to
-        max_bid_price = None # Greatest price in which there is a bidder for the item, if it exists
-        max_bid_count = None # Number of bidders at the max bid price, if it exists
-
-        for price_point in item.bidding_info:
-            if price_point['sellers'] != 0 and price_point['price'] <= compare_price_listed:
-                compare_price_listed = price_point['price']
-                min_list_price = price_point['price']
-                min_list_count = price_point['sellers']
-
-            if price_point['buyers'] != 0 and price_point['price'] >= compare_price_bid:
-                compare_price_bid = price_point['price']
-                max_bid_price = price_point['price']
-                max_bid_count = price_point['buyers']
-            
+        min_list_price, min_list_count = item.snapshot.min_listed()
+        max_bid_price, max_bid_count = item.snapshot.max_bid()
 
         return {'min_list_price': min_list_price, 'min_list_count': min_list_count, \
                 'max_bid_price': max_bid_price, 'max_bid_count': max_bid_count}
 
+class Suggestions(Message):
+
+    def deliverable(self, suggestions: list) -> str:
+        '''
+        Returns "did you mean" suggestions for a search term that did not match any item well.
+        '''
+        s = "Could not find an item matching all search terms. Did you mean:\n"
+        for i, name in enumerate(suggestions, 1):
+            s += f"{i}. **{name}**\n"
+        return s
+
+class History(Message):
+
+    SPARKS = "▁▂▃▄▅▆▇█"
+
+    def deliverable(self, item: History) -> str:
+        '''
+        Returns the price trend of item at every recorded resolution, to be sent as an embed to Discord.
+        '''
+        s = ""
+        for resolution, points in item.series.items():
+            prices = [point.base_price for point in points if point.base_price is not None]
+            if not prices:
+                continue
+
+            s += f"**{self._span_text(resolution, len(points))}**\n"\
+                 f"Base price: **{prices[-1]:,}** ({self._change_text(prices[0], prices[-1])})\n"\
+                 f"Low / High: **{min(prices):,}** / **{max(prices):,}**\n"
+            trades = [point.total_trades for point in points if point.total_trades is not None]
+            if len(trades) > 1:
+                s += f"Trades: **{trades[-1] - trades[0]:,}**\n"
+            s += f"`{self._sparkline(prices)}`\n\n"
+
+        return s or "No price history recorded yet."
+
+    def _span_text(self, resolution: int, count: int) -> str:
+        span = resolution * count
+        return f"Last {span // 86400} days" if span >= 2 * 86400 else f"Last {max(1, span // 3600)} hours"
+
+    def _change_text(self, first: int, last: int) -> str:
+        return f"{(last - first) / first:+.1%}" if first else "N/A"
+
+    def _sparkline(self, prices: list, width: int=30) -> str:
+        '''
+        Returns prices as a line of block characters, averaged down to at most width characters.
+        '''
+        step = max(1, -(-len(prices) // width))
+        averages = [sum(prices[i:i + step]) / len(prices[i:i + step]) for i in range(0, len(prices), step)]
+        low, high = min(averages), max(averages)
+        if high == low:
+            return self.SPARKS[3] * len(averages)
+        return "".join(self.SPARKS[round((price - low) / (high - low) * (len(self.SPARKS) - 1))] for price in averages)
+
+class Leaderboard(Message):
+
+    def deliverable(self, profits: list, unpriced: int=0) -> str:
+        '''
+        Returns craftable items ranked by profit margin, to be sent as an embed to Discord. unpriced is the number of
+        items left out for lack of prices.
+        '''
+        if not profits:
+            return "No prices available yet." + (f" {unpriced:,} items are waiting for the market poller." if unpriced else "")
+
+        s = ""
+        for i, profit in enumerate(profits, 1):
+            profit_emote = ':x:' if profit.margin < 0 else ':white_check_mark:'
+            s += f"{i}. **{profit.name}**: **{int(profit.margin):,}** {profit_emote}\n"\
+                 f"    Recipe {profit.recipe_number}, cost {int(profit.cost):,}, value {int(profit.value):,}\n"
+        if unpriced:
+            s += f"\n{unpriced:,} items are not ranked yet: they are unpriced until the market poller prices them.\n"
+        return s
+
 class Craftable(Message):
     
-    def deliverable(self, item: Craftable):
+    def deliverable(self, item: Craftable, profit: Union[Profit, None]=None):
         '''
-        Formats final recipe info string to be delivered as discord embed
+        Formats final recipe info string to be delivered as discord embed.
+        profit is the item as computed by the leaderboard with the prices of item (see leaderboard.Leaderboard.profit).
+        Without it, the value and cheapest recipe are computed from item.
         '''
         # Emotes
-        item_value, cheapest_recipe, lowest_price = self._get_item_value_and_cheapest_recipe(item)
+        if profit is not None:
+            item_value, cheapest_recipe, lowest_price = profit.value, profit.recipe_number, profit.cost
+        else:
+            item_value, cheapest_recipe, lowest_price = self._get_item_value_and_cheapest_recipe(item)
         profitability = item_value - lowest_price
         profit_emote = self._profit_emote(profitability)
 
@@ -88,6 +151,7 @@ class Craftable(Message):
         deliverable += self._profit_margin_text(profitability, profit_emote, mastery_text)
         deliverable += "**Recipes**\n"
         deliverable += self._recipe_text(item, longest_string, cheapest_recipe)
+        deliverable += self._tree_text(item, item_value, lowest_price)
 
         if item.substitutions:
             deliverable += "**Substitutions**\n"
@@ -125,6 +189,32 @@ class Craftable(Message):
 
         return s
     
+    def _tree_text(self, item: Item, item_value: Union[int, float], lowest_price: Union[int, float]) -> str:
+        '''
+        Returns the cheapest crafting tree of the item, if crafting some of the ingredients is cheaper than buying them.
+        '''
+        tree = getattr(item, 'tree', None)
+        if tree is None or not any(step.action == CRAFT for step in tree.ingredients):
+            return ""
+
+        profitability = item_value - tree.unit_cost
+        s = f"**Crafting intermediates**\nCost: **{int(tree.unit_cost):,}** (saves {int(lowest_price - tree.unit_cost):,})\n"
+        s += f"Profit margin: **{int(profitability):,}** {self._profit_emote(profitability)}\n"
+        s += f"```Recipe {tree.recipe_number}:\n"
+        for step in tree.ingredients:
+            s += self._step_text(step, 0, item.verbose)
+        s += "```\n"
+        return s
+
+    def _step_text(self, step: Step, depth: int, verbose: bool) -> str:
+        quantity = f"{step.quantity:.2f}".rstrip('0').rstrip('.')
+        action = f" (craft, recipe {step.recipe_number})" if step.action == CRAFT else \
+            f" ({int(step.unit_cost):,})" if verbose and step.action == BUY else ""
+        s = f"{'  ' * depth}{step.name} x{quantity}{action}\n"
+        for ingredient in step.ingredients:
+            s += self._step_text(ingredient, depth + 1, verbose)
+        return s
+
     def _substitution_text(self, item: Item) -> str:
         s = ""
         for ingredient_group, substitutes in item.substitutions.items():
@@ -139,84 +229,6 @@ class Craftable(Message):
         all_ingredients = [ingredient.name for recipe_number in item.recipes for ingredient in item.recipes[recipe_number].recipe]
         return max(len(ingredient) for ingredient in all_ingredients)
     
-    def _cooking_mastery(self, item: Item) -> tuple[dict, dict]:
-        '''
-        Returns average cooking rates based on cooking mastery.
-        '''
-        name = item.name.lower()
-        mastery_mult = cooking_mastery_dict[item.mastery]
-
-        # For items with proc exceptions
-        if name in cooking_exceptions.keys():
-            return cooking_exceptions[name], mastery_mult
-        
-        return {'reg_base': 2.5, 'reg_mult': 1.5, 'rare_base': 1.5, 'rare_mult': 0.5, 'rare_proc_base_chance': 0.2}, mastery_mult
-
-    def _alchemy_mastery(self, item: Item) -> tuple[dict, dict]:
-        '''
-        Returns average alchemy rates based on alchemy mastery.
-        '''
-        name = item.name.lower()
-        mastery_mult = alchemy_mastery_dict[item.mastery]
-
-        # For items with different proc rates than the norm
-        if name in alchemy_exceptions.keys():
-            return alchemy_exceptions[name], mastery_mult
-
-        # For items that can only proc once per craft
-        elif 'perfume' in name or 'draught' in name or 'deep sea' in name or\
-            'indignation' in name or 'khalk' in name or 'sturdy whale tendon elixir' == name or\
-            'sturdy whale tendon potion' == name or 'elixir of regeneration' == name or\
-            ("party" in name and "harmony" in name):
-            return {'reg_base': 1, 'reg_mult': 0, 'rare_base': 0, 'rare_mult': 0}, mastery_mult
-        
-        return {'reg_base': 2.5, 'reg_mult': 1.5, 'rare_base': 0.3, 'rare_mult': 0}, mastery_mult
-    
-    def _get_cooking_item_value(self, item: Item) -> Union[int, float]:
-        '''
-        Returns the item value as a result from one cooking proc.
-        '''
-        rates, mastery_multiplers = self._cooking_mastery(item)
-
-        reg_price = item.last_sold_price
-        rare_price = 0 if item.higher_grade.name is None else item.higher_grade.last_sold_price
-
-        reg_base_proc = rates['reg_base']
-        reg_additional_proc = rates['reg_mult']
-        reg_additional_proc_chance = mastery_multiplers["Regular Max Proc Chance"]
-
-        rare_base_proc = rates['rare_base']
-        rare_additional_proc = rates['rare_mult']
-        rare_additional_proc_chance = mastery_multiplers["Regular Max Proc Chance"]
-        rare_proc_base_chance = rates['rare_proc_base_chance']
-        rare_proc_additional_chance = mastery_multiplers['Rare Add. Chance']
-
-        item_value = reg_price * (reg_base_proc + reg_additional_proc * reg_additional_proc_chance) + \
-        rare_price * (rare_base_proc + rare_additional_proc * rare_additional_proc_chance) * (rare_proc_base_chance + rare_proc_additional_chance)
-        
-        return item_value
-    
-    def _get_alchemy_item_value(self, item: Item) -> Union[int, float]:
-        '''
-        Returns the item value as a result from one alchemy proc.
-        '''
-        rates, mastery_multiplers = self._alchemy_mastery(item)
-
-        reg_price = item.last_sold_price
-        rare_price = 0 if item.higher_grade.name is None else item.higher_grade.last_sold_price
-
-        reg_base_proc = rates['reg_base']
-        reg_max_proc_multiplier = rates['reg_mult']
-        reg_max_proc_chance_multiplier = mastery_multiplers["Max Proc Chance"]
-
-        rare_base_proc = rates['rare_base']
-
-
-        item_value = reg_price * (reg_base_proc + reg_max_proc_multiplier * reg_max_proc_chance_multiplier) +\
-                    rare_price * (rare_base_proc)
-
-        return item_value
-    
     def _get_cheapest_recipe(self, item: Item) -> tuple[str, Union[int, float]]:
         '''
         Returns the cheapest recipe and the cost of the recipe, given a list of different recipes that crafts the same item.
@@ -246,20 +258,53 @@ class Craftable(Message):
         Gets price of item, the cheapest recipe to craft the item (if there are multiple recipes), and the cost of using cheapest recipe.
         '''
         cheapest_recipe, lowest_price = self._get_cheapest_recipe(item)
-        if item.category == 'Food':
-            item_value = self._get_cooking_item_value(item)
-                
-        elif 'elixir' in item.category.lower():
-            item_value = self._get_alchemy_item_value(item)
-
-        elif item.category == 'Material':
-            item_value = 0 if not item.name else item.last_sold_price * 2.5
-
-        else:
-            item_value = 0 if not item.name else item.last_sold_price
+        rare_price = 0 if item.higher_grade.name is None else item.higher_grade.last_sold_price
+        item_value = 0 if not item.name else crafting.item_value(item.category, item.name, item.mastery, item.last_sold_price, rare_price)
 
         return item_value, cheapest_recipe, lowest_price
     
+class Sweep(Craftable):
+
+    def deliverable(self, item: Craftable) -> str:
+        '''
+        Returns the profit margin of the item at every mastery bracket and the break-even mastery, to be sent as an embed
+        to Discord. Every bracket is computed from the same prices.
+        '''
+        cheapest_recipe, lowest_price = self._get_cheapest_recipe(item)
+        rare_price = 0 if item.higher_grade.name is None else item.higher_grade.last_sold_price
+        profits = crafting.value_curve(item.category, item.name, item.last_sold_price, rare_price) - lowest_price
+
+        tree_profits = None
+        solver = getattr(item, 'solver', None)
+        if solver is not None:
+            tree_costs = np.array([solver.craft_cost(item.name, bracket)[0] for bracket in crafting.BRACKETS])
+            if (tree_costs < lowest_price).any():
+                tree_profits = profits + lowest_price - tree_costs
+
+        deliverable = self._name_text(item)
+        deliverable += f"Recipe {cheapest_recipe} cost: **{int(lowest_price):,}**\n"
+        deliverable += f"Break-even mastery: **{self._break_even_text(profits)}**\n"
+        if tree_profits is not None:
+            deliverable += f"Break-even mastery, crafting intermediates: **{self._break_even_text(tree_profits)}**\n"
+        deliverable += "\n" + self._curve_text(profits, tree_profits)
+        return deliverable
+
+    def _break_even_text(self, profits: np.ndarray) -> str:
+        mastery = crafting.break_even(profits)
+        return "Never" if mastery is None else f"{mastery:,}"
+
+    def _curve_text(self, profits: np.ndarray, tree_profits: Union[np.ndarray, None], step: int=2) -> str:
+        '''
+        Returns the profit per craft at every step-th bracket (every 100 mastery by default), and with crafted
+        intermediates if cheaper.
+        '''
+        s = "```Mastery    Profit" + ("    Intermediates" if tree_profits is not None else "") + "\n"
+        for i in range(0, len(crafting.BRACKETS), step):
+            s += f"{int(float(crafting.BRACKETS[i])):>7,}{int(profits[i]):>10,}"
+            s += f"{int(tree_profits[i]):>17,}\n" if tree_profits is not None else "\n"
+        s += "```\n"
+        return s
+
 
 if __name__ == "__main__":
     ...
\ No newline at end of file
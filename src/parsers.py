@@ -0,0 +1,96 @@
+'''
+Parsers of the trade market API responses.
+Records are separated by a pipe (|), and the fields of a record by a hyphen (-). Responses are either JSON with the
+records in "resultMsg", or Huffman packed records (see unpack_bytes).
+'''
+import json
+from array import array
+from typing import NamedTuple
+from unpack_bytes import unpack
+
+
+class SubListEntry(NamedTuple):
+    '''
+    One enhancement level of an item, from GetWorldMarketSubList.
+    '''
+    id: int
+    enhancement_min: int
+    enhancement_max: int
+    base_price: int
+    current_stock: int
+    total_trades: int
+    price_min: int
+    price_max: int
+    last_sold_price: int
+    last_sold_time: int
+
+
+class MarketListEntry(NamedTuple):
+    '''
+    One item of a market category, from GetWorldMarketList.
+    '''
+    id: int
+    current_stock: int
+    total_trades: int
+    base_price: int
+
+
+class BiddingInfo(NamedTuple):
+    '''
+    Price ladder of an item, from GetBiddingInfoList, as parallel columns.
+    '''
+    prices: array
+    sellers: array
+    buyers: array
+
+
+def result_message(response: bytes) -> str:
+    '''
+    Returns "resultMsg" of a JSON response.
+    '''
+    return json.loads(response)['resultMsg']
+
+def integers(records: str) -> array:
+    '''
+    Parses pipe separated records of hyphen separated integers into one flat int64 array.
+    '''
+    records = records.rstrip('|')
+    if not records:
+        return array('q')
+    return array('q', map(int, records.replace('|', '-').split('-')))
+
+def parse_world_market_sub_list(response: bytes) -> list:
+    '''
+    Parses a GetWorldMarketSubList response into one SubListEntry per enhancement level.
+    '''
+    values = integers(result_message(response))
+    fields = len(SubListEntry._fields)
+    return [SubListEntry._make(values[i:i + fields]) for i in range(0, len(values), fields)]
+
+def parse_bidding_info_list(response: bytes) -> BiddingInfo:
+    '''
+    Parses a Huffman packed GetBiddingInfoList response into price, sell order and buy order columns.
+    '''
+    values = integers(unpack(response))
+    return BiddingInfo(values[0::3], values[1::3], values[2::3])
+
+def parse_market_price_info(response: bytes) -> array:
+    '''
+    Parses a GetMarketPriceInfo response into the daily price history of an item, oldest first.
+    '''
+    return integers(result_message(response))
+
+def parse_world_market_list(response: bytes) -> list:
+    '''
+    Parses a GetWorldMarketList response into one MarketListEntry per item of the category.
+    The response is JSON or Huffman packed, and records may carry more fields than MarketListEntry, which are ignored.
+    '''
+    records = result_message(response) if response.lstrip().startswith(b'{') else unpack(response)
+    fields = len(MarketListEntry._fields)
+    return [MarketListEntry._make(map(int, record.split('-')[:fields])) for record in records.split('|') if record]
+
+def format_records(records: list) -> str:
+    '''
+    Inverse of the parsers: formats records (tuples of integers) as pipe/hyphen separated text.
+    '''
+    return ''.join('-'.join(map(str, record)) + '|' for record in records)
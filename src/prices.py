@@ -0,0 +1,249 @@
+'''
+Whole market price table, kept up to date by a background poller.
+Commands read sublists from the table when they are fresh enough, so that they do not wait for the trade market API.
+'''
+import asyncio, time
+from typing import Union
+from market import MarketClient, market
+from history import PriceHistory, price_history, POLL_INTERVAL
+from profiles import EnhancementProfiles, enhancement_profiles
+from parsers import SubListEntry
+from cache import RedisBackend, shared_backend
+
+
+# Main categories of the trade market. Their subcategories are discovered by the poller.
+MAIN_CATEGORIES = (1, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80)
+
+
+class PriceTable:
+    """
+    Latest sublist entry of every enhancement level of every polled item, keyed by (id, sid), with the time it was
+    stored. Times are wall clock times, so that tables exported by another process (see export) keep their age.
+    """
+    def __init__(self) -> None:
+        self._entries = {} # (id, sid) -> (SubListEntry, time stored)
+        self._levels = {} # id -> number of enhancement levels
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set_sub_list(self, id: int, sub_list: list, stored_at: Union[float, None]=None) -> None:
+        '''
+        Stores every enhancement level of a sublist, as stored at stored_at (now by default).
+        '''
+        stored_at = time.time() if stored_at is None else stored_at
+        for sid in range(len(sub_list), self._levels.get(id, 0)):
+            del self._entries[(id, sid)]
+        for sid, entry in enumerate(sub_list):
+            self._entries[(id, sid)] = (entry, stored_at)
+        self._levels[id] = len(sub_list)
+
+    def touch(self, id: int) -> None:
+        '''
+        Marks every enhancement level of an item as fresh, without changing it.
+        '''
+        stored_at = time.time()
+        for sid in range(self._levels.get(id, 0)):
+            self._entries[(id, sid)] = (self._entries[(id, sid)][0], stored_at)
+
+    def get(self, id: int, sid: int, max_age: float) -> Union[SubListEntry, None]:
+        '''
+        Returns the entry of (id, sid) if it was stored at most max_age seconds ago, otherwise None.
+        '''
+        entry = self._entries.get((id, sid))
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def get_sub_list(self, id: int, max_age: float) -> Union[list, None]:
+        '''
+        Returns the whole sublist of an item if every enhancement level was stored at most max_age seconds ago,
+        otherwise None.
+        '''
+        if id not in self._levels:
+            return None
+        sub_list = [self.get(id, sid, max_age) for sid in range(self._levels[id])]
+        return None if None in sub_list else sub_list
+
+    def age(self, id: int) -> Union[float, None]:
+        '''
+        Returns the seconds since the oldest enhancement level of an item was stored, or None if it is not in the table.
+        '''
+        if not self._levels.get(id):
+            return None
+        return time.time() - self._stored_at(id)
+
+    def export(self) -> dict:
+        '''
+        Returns id -> (sublist, time its oldest enhancement level was stored) of every item, see load.
+        '''
+        return {id: ([self._entries[(id, sid)][0] for sid in range(levels)], self._stored_at(id))
+                for id, levels in self._levels.items() if levels}
+
+    def load(self, sub_lists: dict) -> None:
+        '''
+        Stores the sublists of a table exported by another process, except those this table holds newer.
+        '''
+        for id, (sub_list, stored_at) in sub_lists.items():
+            if not self._levels.get(id) or self._stored_at(id) < stored_at:
+                self.set_sub_list(id, sub_list, stored_at)
+
+    def _stored_at(self, id: int) -> float:
+        return min(self._entries[(id, sid)][1] for sid in range(self._levels[id]))
+
+
+class MarketPoller:
+    """
+    Refreshes the price table with every item of the market, category by category.
+    Each pass lists every category with GetWorldMarketList, then fetches the sublist of every listed item with
+    GetWorldMarketSubList. Items whose stock, trade count and base price did not change since the previous pass are only
+    marked as fresh.
+    With a shared backend, every pass is published to it, and processes that do not poll (see main.py) follow it: they
+    load the latest published pass into their own table.
+
+    PARAMS:
+    client: Market client to send requests through. The poller refreshes its sublist cache too.
+    table: Price table to keep up to date
+    interval: Seconds between the starts of two passes
+    max_concurrency: Maximum number of poller requests in flight at once, so that commands are not starved
+    main_categories: Main categories to poll
+    history: Price history to record every pass in, if any
+    profiles: Enhancement profile index to learn the sublist length of every refreshed item in, if any
+    backend: Backend shared with the other processes of the bot to publish passes in, if any
+    follow_interval: Seconds between two checks for a new pass, when following
+    """
+    TABLE_KEY = ('price_table',)
+    PASS_KEY = ('price_table', 'pass') # Time of the latest published pass, read before the whole table
+
+    def __init__(self, client: MarketClient, table: PriceTable, interval: float=600, max_concurrency: int=4,
+                 main_categories: tuple=MAIN_CATEGORIES, history: Union[PriceHistory, None]=None,
+                 profiles: Union[EnhancementProfiles, None]=None, backend: Union[RedisBackend, None]=None,
+                 follow_interval: float=30) -> None:
+        self.client = client
+        self.table = table
+        self.history = history
+        self.profiles = profiles
+        self.backend = backend
+        self.interval = interval
+        self.follow_interval = follow_interval
+        self.main_categories = main_categories
+        self.passes = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._listings = {} # id -> MarketListEntry of the previous pass
+        self._followed = 0 # Time of the latest pass loaded when following
+        self._task = None
+
+    def start(self, follow: bool=False) -> None:
+        '''
+        Starts polling in the background of the running event loop, or following the passes published by the polling
+        process if follow. Does nothing if it is already running.
+        '''
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.follow() if follow else self.run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self) -> None:
+        '''
+        Polls the market every interval seconds, forever. A failed pass is reported and retried on the next interval.
+        '''
+        while True:
+            start = time.monotonic()
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Market poll failed: {e!r}")
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - start)))
+
+    async def follow(self) -> None:
+        '''
+        Loads every pass published in the backend into the table, forever. Does nothing without a backend.
+        '''
+        if self.backend is None:
+            return
+        while True:
+            try:
+                await self.load_pass()
+            except Exception as e:
+                print(f"Failed to load the polled price table: {e!r}")
+            await asyncio.sleep(self.follow_interval)
+
+    async def load_pass(self) -> bool:
+        '''
+        Loads the latest pass published in the backend if it was not loaded yet. Returns whether one was loaded.
+        '''
+        published = await self.backend.get(self.PASS_KEY)
+        if published is None or published[1] <= self._followed:
+            return False
+        entry = await self.backend.get(self.TABLE_KEY)
+        if entry is None:
+            return False
+        sub_lists, stored_at = entry
+        self.table.load(sub_lists)
+        self._followed = stored_at
+        return True
+
+    async def poll(self) -> None:
+        '''
+        Runs one pass over every category.
+        '''
+        start = time.perf_counter()
+        listings = {}
+        for main_category in self.main_categories:
+            for entries in await self._list_category(main_category):
+                listings.update((entry.id, entry) for entry in entries)
+
+        changed = [id for id, entry in listings.items() if self._listings.get(id) != entry or self.table.age(id) is None]
+        for id in listings.keys() - changed:
+            self.table.touch(id)
+        results = await asyncio.gather(*(self._refresh(id) for id in changed), return_exceptions=True)
+        failed = {id for id, result in zip(changed, results) if isinstance(result, Exception)}
+
+        self._listings = {id: entry for id, entry in listings.items() if id not in failed} # Failed items are retried
+        if self.history is not None:
+            entries = [(sid, entry) for id in self._listings for sid, entry in enumerate(self.table.get_sub_list(id, float('inf')) or ())]
+            await asyncio.to_thread(self.history.record, entries)
+        self.passes += 1
+        if self.backend is not None:
+            await self._publish()
+        print(f"Polled {len(listings)} market items ({len(changed)} changed, {len(failed)} failed) "
+              f"in {time.perf_counter() - start:.1f} s")
+
+    async def _list_category(self, main_category: int) -> list:
+        '''
+        Returns the items of every subcategory of a main category. Subcategories are numbered from 1; the first one
+        without items ends the category.
+        '''
+        subcategories = []
+        sub_category = 1
+        while True:
+            async with self._semaphore:
+                entries = await self.client.get_world_market_list(main_category, sub_category)
+            if not entries:
+                return subcategories
+            subcategories.append(entries)
+            sub_category += 1
+
+    async def _publish(self) -> None:
+        '''
+        Publishes the table for the processes that follow the passes. It is kept for a few intervals, so that followers
+        still have prices if a pass fails.
+        '''
+        stored_at, expire_after = time.time(), 3 * self.interval
+        await self.backend.set(self.TABLE_KEY, self.table.export(), stored_at, expire_after)
+        await self.backend.set(self.PASS_KEY, None, stored_at, expire_after) # After the table, which followers read next
+
+    async def _refresh(self, id: int) -> None:
+        async with self._semaphore:
+            sub_list = await self.client.refresh_world_market_sub_list(id)
+        self.table.set_sub_list(id, sub_list)
+        if self.profiles is not None:
+            self.profiles.learn(id, len(sub_list))
+
+
+price_table = PriceTable()
+poller = MarketPoller(market, price_table, interval=POLL_INTERVAL, history=price_history,
+                      profiles=enhancement_profiles, backend=shared_backend('prices'))
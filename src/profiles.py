@@ -0,0 +1,89 @@
+'''
+Index of the enhancement profile of every item seen, i.e. the length of its sublist (1 for items without enhancement
+levels), learned from past GetWorldMarketSubList responses and persisted in CACHE_DIR.
+With the length known, the sid of an enhancement level is resolved before the sublist arrives (see
+search.Search.sid_from_length), so that the sublist and the bidding info are fetched concurrently.
+'''
+import atexit, json, os, threading, time
+from typing import Union
+from helper import CACHE_DIR
+
+
+PROFILES_PATH = os.path.join(CACHE_DIR, 'enhancement_profiles.json')
+
+
+class EnhancementProfiles:
+    """
+    Item id -> sublist length.
+
+    PARAMS:
+    path: JSON file the index is read from and saved to
+    save_interval: Minimum seconds between two saves. Changes made since the last save are also saved at exit.
+    """
+    def __init__(self, path: str=PROFILES_PATH, save_interval: float=60) -> None:
+        self.path = path
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self._lengths = None # Read on first use
+        self._dirty = False
+        self._saved_at = 0
+        self._lock = threading.Lock()
+        atexit.register(self.save)
+
+    def get(self, id: int) -> Union[int, None]:
+        '''
+        Returns the sublist length of id, or None if it was never seen.
+        '''
+        length = self._get_lengths().get(id)
+        if length is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return length
+
+    def learn(self, id: int, length: int) -> None:
+        '''
+        Records the sublist length of id, and saves the index if it changed and was not saved recently.
+        '''
+        lengths = self._get_lengths()
+        previous = lengths.get(id)
+        if previous == length:
+            return
+        if previous is not None:
+            self.mismatches += 1
+        lengths[id] = length
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def stats(self) -> dict:
+        return {'items': len(self._get_lengths()), 'hits': self.hits, 'misses': self.misses, 'mismatches': self.mismatches}
+
+    def save(self) -> None:
+        '''
+        Writes the index if it changed since it was last written. The file is replaced atomically.
+        '''
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._saved_at = time.monotonic()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, 'w') as file:
+                json.dump(self._lengths, file, separators=(',', ':'))
+            os.replace(temporary_path, self.path)
+
+    def _get_lengths(self) -> dict:
+        if self._lengths is None:
+            try:
+                with open(self.path, 'r') as file:
+                    self._lengths = {int(id): length for id, length in json.load(file).items()}
+            except (FileNotFoundError, ValueError, AttributeError):
+                self._lengths = {}
+        return self._lengths
+
+
+enhancement_profiles = EnhancementProfiles()
@@ -0,0 +1,321 @@
+'''
+Profit matrix and engine of the profit leaderboard (see leaderboard.py).
+All recipes form one recipe x ingredient quantity matrix, so that the cost of every recipe, the cheapest recipe and the
+margin of every craftable item are computed at once with NumPy against one price vector, instead of one !r per item.
+Engines are built in worker processes (see workers.py), which import this module: it only imports the static tables
+and crafting rates, and does not connect to MongoDB or the trade market when imported.
+'''
+import numpy as np
+from typing import Callable, NamedTuple, Union
+import helper
+import crafting
+from recipes import VENDOR, DROP, MARKET
+
+
+class Profit(NamedTuple):
+    '''
+    Margin of one craft of an item with its cheapest recipe, at current prices.
+    '''
+    name: str
+    category: str
+    recipe_number: str
+    cost: float
+    value: float
+    margin: float
+
+
+class ProfitMatrix:
+    """
+    Recipes of every craftable item as a sparse recipe x ingredient quantity matrix (COO triples). Recipes of the same
+    item are contiguous rows, in the order of the recipe store.
+    Columns are priced goods: market items (by id), vendor items (fixed price) and loot (free), followed by two
+    columns for items that could not be resolved (NaN) and for missing higher grade items (0).
+    Ingredients that have substitutes are priced as the first of them, as in !r (see recipes.resolve_recipe).
+
+    PARAMS:
+    recipes: name -> recipes.CraftableRecipes of every craftable item
+    market_id: Returns the id of a market item name, or None if it is not in the market
+    craftable_id: Returns the id of a craftable item name, or None if it is not in the market
+    """
+    # Placeholder columns while building, replaced by the last two columns of the price vector
+    MISSING = -1
+    NONE = -2
+
+    def __init__(self, recipes: dict, market_id: Callable[[str], Union[int, None]],
+                 craftable_id: Callable[[str], Union[int, None]]) -> None:
+        self.names, self.categories, self.recipe_numbers = [], [], []
+        self.market_ids = [] # Column -> market id, None for vendor items and loot
+        self._fixed_prices = [] # Column -> price of vendor items and loot, NaN for market items
+        self._columns = {} # (kind, id or name) -> column
+        starts, rows, columns, quantities, item_columns, higher_grade_columns = [], [], [], [], [], []
+
+        for name, craftable in recipes.items():
+            if not craftable.recipes:
+                continue
+            self.names.append(name)
+            self.categories.append(craftable.category)
+            starts.append(len(self.recipe_numbers))
+            item_columns.append(self._market_column(craftable_id(name)))
+            higher_grade_columns.append(self._market_column(market_id(craftable.higher_grade))
+                                        if craftable.higher_grade else self.NONE)
+
+            for recipe_number, recipe in craftable.recipes.items():
+                row = len(self.recipe_numbers)
+                self.recipe_numbers.append(recipe_number)
+                for ingredient in recipe.ingredients:
+                    if ingredient.kind == VENDOR:
+                        column = self._column((VENDOR, ingredient.name), None, helper.static_items[ingredient.name])
+                    elif ingredient.kind == DROP:
+                        column = self._column((DROP, ingredient.name), None, 0)
+                    else:
+                        column = self._market_column(market_id(ingredient.name))
+                    rows.append(row)
+                    columns.append(column)
+                    quantities.append(float(ingredient.quantity))
+
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.diff(np.append(self.starts, len(self.recipe_numbers)))
+        self.rows = np.array(rows, dtype=np.int64)
+        self.quantities = np.array(quantities, dtype=np.float64)
+        self.columns = self._final_columns(columns)
+        self.item_columns = self._final_columns(item_columns)
+        self.higher_grade_columns = self._final_columns(higher_grade_columns)
+        self._fixed_prices = np.array(self._fixed_prices + [np.nan, 0], dtype=np.float64)
+        self._coefficients = {} # mastery -> (regular, rare) coefficient of every item
+        self.market_columns = {id: column for column, id in enumerate(self.market_ids) if id is not None}
+
+    def price_vector(self, prices: dict) -> np.ndarray:
+        '''
+        Returns the price of every column, given market id -> price. Market items without a price are NaN.
+        '''
+        vector = self._fixed_prices.copy()
+        for column, id in enumerate(self.market_ids):
+            if id is not None:
+                vector[column] = prices.get(id, np.nan)
+        return vector
+
+    def rank(self, prices: dict, mastery: str, category: Union[Callable[[str], bool], None]=None,
+             limit: Union[int, None]=None) -> list:
+        '''
+        Returns a Profit for every craftable item (of category, if given) whose item and cheapest recipe have prices,
+        best margin first, up to limit items. Equally cheap recipes resolve to the first one, as in message.Craftable.
+        '''
+        if not self.names:
+            return []
+
+        price = self.price_vector(prices)
+        cost = np.bincount(self.rows, weights=self.quantities * price[self.columns], minlength=len(self.recipe_numbers))
+        cost = np.where(np.isnan(cost), np.inf, cost)
+
+        lowest = np.minimum.reduceat(cost, self.starts)
+        cheapest_rows = np.flatnonzero(cost == np.repeat(lowest, self.counts))
+        cheapest = cheapest_rows[np.searchsorted(cheapest_rows, self.starts)]
+
+        regular, rare = self.get_coefficients(mastery)
+        value = regular * price[self.item_columns] + rare * price[self.higher_grade_columns]
+        margin = value - lowest
+
+        candidates = np.isfinite(margin)
+        if category is not None:
+            candidates &= np.array([category(item_category) for item_category in self.categories], dtype=bool)
+        positions = np.flatnonzero(candidates)
+        positions = positions[np.argsort(-margin[positions], kind='stable')][:limit]
+        return [Profit(self.names[i], self.categories[i], self.recipe_numbers[cheapest[i]], float(lowest[i]), float(value[i]),
+                       float(margin[i])) for i in positions]
+
+    def get_coefficients(self, mastery: str) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the value coefficients of every item at mastery, see crafting.value_coefficients.
+        '''
+        coefficients = self._coefficients.get(mastery)
+        if coefficients is None:
+            pairs = [crafting.value_coefficients(category, name, mastery) for name, category in zip(self.names, self.categories)]
+            coefficients = (np.array([regular for regular, rare in pairs], dtype=np.float64),
+                            np.array([rare for regular, rare in pairs], dtype=np.float64))
+            self._coefficients[mastery] = coefficients
+        return coefficients
+
+    def _market_column(self, id: Union[int, None]) -> int:
+        return self.MISSING if id is None else self._column((MARKET, id), id, np.nan)
+
+    def _column(self, key: tuple, id: Union[int, None], fixed_price: float) -> int:
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = len(self.market_ids)
+            self.market_ids.append(id)
+            self._fixed_prices.append(fixed_price)
+        return column
+
+    def _final_columns(self, columns: list) -> np.ndarray:
+        placeholders = {self.MISSING: len(self.market_ids), self.NONE: len(self.market_ids) + 1}
+        return np.array([placeholders.get(column, column) for column in columns], dtype=np.int64)
+
+
+def gather(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the indices of the ranges [start, start + count), concatenated, and the range each index belongs to.
+    '''
+    ends = np.cumsum(counts)
+    groups = np.repeat(np.arange(len(starts)), counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts) + np.repeat(starts, counts), groups
+
+
+class ProfitEngine:
+    """
+    Cheapest recipe and margin of every craftable item of a ProfitMatrix, kept up to date incrementally.
+    A dependency graph maps every market id to the recipes using it as an ingredient and to the items it is the price or
+    higher grade price of. When prices change, only the cost of dependent recipes, the cheapest recipe of their items and
+    the margins of affected items are recomputed.
+    Results are versioned: version is incremented by every update that changed a price.
+    """
+    def __init__(self, matrix: ProfitMatrix) -> None:
+        self.matrix = matrix
+        self.version = 0
+        self.prices = matrix.price_vector({})
+        self.positions = {name: position for position, name in enumerate(matrix.names)}
+        self._row_starts = np.searchsorted(matrix.rows, np.arange(len(matrix.recipe_numbers) + 1))
+        self._row_items = np.repeat(np.arange(len(matrix.names)), matrix.counts)
+
+        recipe_dependents, item_dependents = {}, {} # Market id -> recipe rows, items
+        for column, row in zip(matrix.columns.tolist(), matrix.rows.tolist()):
+            if column < len(matrix.market_ids) and matrix.market_ids[column] is not None:
+                recipe_dependents.setdefault(matrix.market_ids[column], set()).add(row)
+        for item_columns in (matrix.item_columns, matrix.higher_grade_columns):
+            for position, column in enumerate(item_columns.tolist()):
+                if column < len(matrix.market_ids):
+                    item_dependents.setdefault(matrix.market_ids[column], set()).add(position)
+        self.recipe_dependents = {id: np.array(sorted(rows), dtype=np.int64) for id, rows in recipe_dependents.items()}
+        self.item_dependents = {id: np.array(sorted(items), dtype=np.int64) for id, items in item_dependents.items()}
+
+        self.cost = np.full(len(matrix.recipe_numbers), np.inf)
+        self.lowest = np.full(len(matrix.names), np.inf)
+        self.cheapest = np.zeros(len(matrix.names), dtype=np.int64)
+        self._margins = {} # mastery -> (value, margin) of every item
+        self._recompute(np.arange(len(matrix.recipe_numbers)), np.arange(len(matrix.names)))
+
+    def update_prices(self, prices: dict) -> np.ndarray:
+        '''
+        Applies market id -> price. Prices of ids that are not given are kept. Returns the positions of the items whose
+        results were recomputed.
+        '''
+        changed = []
+        for id, price in prices.items():
+            column = self.matrix.market_columns.get(id)
+            if column is not None and not (price == self.prices[column]):
+                self.prices[column] = price
+                changed.append(id)
+        if not changed:
+            return np.zeros(0, dtype=np.int64)
+
+        empty = np.zeros(0, dtype=np.int64)
+        rows = np.unique(np.concatenate([self.recipe_dependents.get(id, empty) for id in changed]))
+        items = np.unique(np.concatenate([self._row_items[rows]] + [self.item_dependents.get(id, empty) for id in changed]))
+        self._recompute(rows, items)
+        self.version += 1
+        return items
+
+    def profit(self, name: str, mastery: str) -> Union[Profit, None]:
+        '''
+        Returns the Profit of the craftable item name at mastery, or None if it has no price yet.
+        '''
+        position = self.positions.get(name)
+        if position is None:
+            return None
+        value, margin = self._get_margins(mastery)
+        return self._profit(position, value, margin) if np.isfinite(margin[position]) else None
+
+    def rank(self, mastery: str, category: Union[Callable[[str], bool], None]=None, limit: Union[int, None]=None) -> list:
+        '''
+        Same as ProfitMatrix.rank, with the current prices.
+        '''
+        value, margin = self._get_margins(mastery)
+        candidates = np.isfinite(margin)
+        if category is not None:
+            candidates &= np.array([category(item_category) for item_category in self.matrix.categories], dtype=bool)
+        positions = np.flatnonzero(candidates)
+        positions = positions[np.argsort(-margin[positions], kind='stable')][:limit]
+        return [self._profit(position, value, margin) for position in positions]
+
+    def unpriced(self, mastery: str, category: Union[Callable[[str], bool], None]=None) -> int:
+        '''
+        Returns the number of craftable items (of category, if given) left out of rank, their item or every recipe
+        lacking a price.
+        '''
+        candidates = ~np.isfinite(self._get_margins(mastery)[1])
+        if category is not None:
+            candidates &= np.array([category(item_category) for item_category in self.matrix.categories], dtype=bool)
+        return int(np.count_nonzero(candidates))
+
+    def _profit(self, position: int, value: np.ndarray, margin: np.ndarray) -> Profit:
+        matrix = self.matrix
+        return Profit(matrix.names[position], matrix.categories[position], matrix.recipe_numbers[self.cheapest[position]],
+                      float(self.lowest[position]), float(value[position]), float(margin[position]))
+
+    def _get_margins(self, mastery: str) -> tuple[np.ndarray, np.ndarray]:
+        margins = self._margins.get(mastery)
+        if margins is None:
+            margins = self._margins[mastery] = self._values(mastery, slice(None))
+        return margins
+
+    def _values(self, mastery: str, items: Union[np.ndarray, slice]) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the value and margin of items at mastery.
+        '''
+        regular, rare = self.matrix.get_coefficients(mastery)
+        value = regular[items] * self.prices[self.matrix.item_columns[items]] + \
+            rare[items] * self.prices[self.matrix.higher_grade_columns[items]]
+        return value, value - self.lowest[items]
+
+    def _recompute(self, rows: np.ndarray, items: np.ndarray) -> None:
+        '''
+        Recomputes the cost of rows, then the cheapest recipe and margins of items. Every item of rows is in items.
+        '''
+        matrix = self.matrix
+        if len(rows):
+            entries, groups = gather(self._row_starts[rows], np.diff(self._row_starts)[rows])
+            cost = np.bincount(groups, weights=matrix.quantities[entries] * self.prices[matrix.columns[entries]], minlength=len(rows))
+            self.cost[rows] = np.where(np.isnan(cost), np.inf, cost)
+
+        if len(items):
+            item_rows, _ = gather(matrix.starts[items], matrix.counts[items])
+            offsets = np.cumsum(matrix.counts[items]) - matrix.counts[items]
+            cost = self.cost[item_rows]
+            lowest = np.minimum.reduceat(cost, offsets)
+            cheapest = np.flatnonzero(cost == np.repeat(lowest, matrix.counts[items]))
+            self.lowest[items] = lowest
+            self.cheapest[items] = item_rows[cheapest[np.searchsorted(cheapest, offsets)]]
+            for mastery, (value, margin) in self._margins.items():
+                value[items], margin[items] = self._values(mastery, items)
+
+
+def build_engine(recipes: dict, market_id: Callable[[str], Union[int, None]], craftable_id: Callable[[str], Union[int, None]],
+                 prices: dict) -> ProfitEngine:
+    '''
+    Builds the ProfitMatrix of recipes and its ProfitEngine, with market id -> price applied.
+    '''
+    engine = ProfitEngine(ProfitMatrix(recipes, market_id, craftable_id))
+    engine.update_prices(prices)
+    return engine
+
+
+_exact_ids = (None, {}) # (helper.static_version, lowercased name -> id), see market_id
+
+def market_id(name: str) -> Union[int, None]:
+    '''
+    Returns the id of an ingredient or higher grade item, found the same way as Item(name, exact=True): the id of the
+    first name of helper.all_name_to_id that matches, ignoring case.
+    '''
+    global _exact_ids
+    version, ids = _exact_ids
+    if version != helper.static_version:
+        ids = {}
+        for item_name, id in helper.all_name_to_id.items():
+            ids.setdefault(item_name.lower(), id)
+        _exact_ids = (helper.static_version, ids)
+    return ids.get(name.lower())
+
+def craftable_id(name: str) -> Union[int, None]:
+    '''
+    Returns the id of a craftable item, or None if it is not in the market.
+    '''
+    return helper.craftable_name_to_id.get(name)
@@ -0,0 +1,280 @@
+'''
+In-memory store of the craftable_items collection.
+Every craftable document is loaded once, and the ingredients of its recipes are resolved once (special names,
+substitutions, vendor/loot/market items), so that looking up the recipes of an item is a dict lookup instead of a
+round trip to MongoDB. The store follows changes to the collection with a change stream, or by polling it if change
+streams are not available. Processes of a sharded bot share the loaded documents through a cache backend, so that only
+one of them queries the collection. The loaded documents are also kept in a local snapshot, which the store starts from
+if MongoDB is unreachable.
+'''
+import os, threading, time
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+from typing import Callable, NamedTuple, Union
+import helper
+from cache import RedisBackend
+
+
+VENDOR = 'vendor'
+DROP = 'drop'
+MARKET = 'market'
+
+PROJECTION = {'name': 1, 'category': 1, 'higher_grade': 1, 'all_recipes': 1}
+
+RECIPES_SNAPSHOT_PATH = os.path.join(helper.CACHE_DIR, 'craftable_items.snapshot')
+
+
+class Ingredient(NamedTuple):
+    '''
+    An ingredient of a recipe, after special names and substitutions are applied.
+    kind is VENDOR (bought from an NPC), DROP (only obtained as loot) or MARKET.
+    '''
+    name: str
+    quantity: Union[int, float, str]
+    kind: str
+
+
+class ResolvedRecipe(NamedTuple):
+    '''
+    Ingredients of one recipe, and the substitutions of the ingredients that have any (ingredient -> substitutes).
+    '''
+    ingredients: tuple
+    substitutions: dict
+
+
+class CraftableRecipes(NamedTuple):
+    '''
+    Everything needed from a craftable_items document: recipe number -> ResolvedRecipe.
+    '''
+    name: str
+    category: str
+    higher_grade: str
+    recipes: dict
+
+
+def resolve_recipe(recipe: dict, is_market_item: Callable[[str], bool]) -> ResolvedRecipe:
+    '''
+    Resolves the ingredients of a recipe as stored in craftable_items (ingredient -> quantity).
+    '''
+    ingredients = []
+    recipe_substitutions = {}
+    for ingredient, quantity in recipe.items():
+        if ingredient in helper.special:
+            ingredient = helper.special[ingredient]
+
+        if ingredient in helper.substitutions:
+            recipe_substitutions[ingredient] = helper.substitutions[ingredient]
+            ingredient = helper.substitutions[ingredient][0]
+
+        if ingredient in helper.static_items:
+            ingredients.append(Ingredient(ingredient, quantity, VENDOR))
+        elif not is_market_item(ingredient):
+            ingredients.append(Ingredient(ingredient, quantity, DROP))
+        else:
+            ingredients.append(Ingredient(ingredient, int(quantity), MARKET))
+    return ResolvedRecipe(tuple(ingredients), recipe_substitutions)
+
+
+class RecipeStore:
+    """
+    Recipes of every craftable item, keyed by the official item name.
+
+    PARAMS:
+    collection: The craftable_items collection
+    is_market_item: Returns whether an ingredient name is an item in the market
+    poll_interval: Seconds between reloads of the collection when change streams are not available
+    backend: Cache backend to share the loaded documents with other processes through, see cache.shared_backend.
+             Documents shared less than poll_interval seconds ago are loaded from it instead of the collection.
+    snapshot_path: File to keep a copy of the loaded documents in, see helper.write_snapshot. None keeps no copy.
+    """
+    SHARED_KEY = ('craftable_items',)
+    RETRY_INTERVAL = 30 # Seconds between attempts to load the collection, while the store runs on its snapshot
+
+    def __init__(self, collection: Collection, is_market_item: Callable[[str], bool], poll_interval: float=600,
+                 backend: Union[RedisBackend, None]=None, snapshot_path: Union[str, None]=None) -> None:
+        self.collection = collection
+        self.is_market_item = is_market_item
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.snapshot_path = snapshot_path
+        self.fresh = False # Whether the documents were loaded from the collection or the backend, not the snapshot
+        self.version = None # helper.static_version the recipes were resolved with
+        self.changes = 0 # Incremented every time any recipe changes
+        self._documents = {} # name -> craftable_items document
+        self._names = {} # _id -> name, to apply deletions from the change stream
+        self._recipes = {} # name -> CraftableRecipes
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._get_recipes()
+
+    def __len__(self) -> int:
+        return len(self._get_recipes())
+
+    def get(self, name: str) -> CraftableRecipes:
+        '''
+        Returns the recipes of the craftable item name. Raises KeyError if there is no such item.
+        '''
+        return self._get_recipes()[name]
+
+    def all(self) -> dict:
+        '''
+        Returns the recipes of every craftable item, name -> CraftableRecipes. The dict must not be modified.
+        '''
+        return self._get_recipes()
+
+    def load(self) -> 'RecipeStore':
+        '''
+        Loads every craftable document in one query, streamed in batches, and resolves all recipes. Documents recently
+        loaded by another process are taken from the backend instead.
+        '''
+        start = time.perf_counter()
+        shared = self.backend.read(self.SHARED_KEY) if self.backend is not None else None
+        if shared is not None and time.time() - shared[1] < self.poll_interval:
+            documents, source = shared[0], "cache backend"
+        else:
+            documents = {document['name']: document for document in self.collection.find({}, PROJECTION, batch_size=1000)}
+            source = "MongoDB"
+        with self._lock:
+            changed = documents != self._documents
+            self._documents = documents
+            self._names = {document['_id']: name for name, document in documents.items()}
+            self.fresh = True
+            if changed or self.version != helper.static_version:
+                self._resolve_all()
+            if source == "MongoDB":
+                self._share()
+                if changed:
+                    self._persist()
+        print(f"Loaded {len(documents)} craftable items from {source} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return self
+
+    def start(self) -> None:
+        '''
+        Loads the store if it is not loaded yet, and starts following changes to the collection in a daemon thread.
+        If MongoDB is unreachable, the store starts from its snapshot, or empty if there is none, and the thread keeps
+        trying to load the collection.
+        '''
+        if self.version is None:
+            try:
+                self.load()
+            except PyMongoError as e:
+                print(f"Could not load craftable items, starting from the local snapshot: {e!r}")
+                self._load_snapshot()
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._follow_changes, daemon=True)
+            self._watcher.start()
+
+    def _get_recipes(self) -> dict:
+        '''
+        Returns the resolved recipes, loading them on first use and resolving them again if the static tables changed.
+        '''
+        if self.version is None:
+            self.load()
+        elif self.version != helper.static_version:
+            with self._lock:
+                self._resolve_all()
+        return self._recipes
+
+    def _resolve_all(self) -> None:
+        '''
+        Resolves the recipes of every loaded document. Replaces the resolved recipes at once, so readers never see a
+        partially resolved store. Counts a change only if any recipe resolved differently. Callers hold the lock.
+        '''
+        version = helper.static_version
+        recipes = {name: self._resolve(document) for name, document in self._documents.items()}
+        if recipes != self._recipes:
+            self.changes += 1
+        self._recipes = recipes
+        self.version = version
+
+    def _load_snapshot(self) -> None:
+        '''
+        Loads the documents of the snapshot, or no documents if there is none.
+        '''
+        documents = helper.read_snapshot(self.snapshot_path) if self.snapshot_path is not None else None
+        with self._lock:
+            self._documents = documents or {}
+            self._names = {document['_id']: name for name, document in self._documents.items()}
+            self._resolve_all()
+        print(f"Loaded {len(self._documents)} craftable items from the local snapshot")
+
+    def _persist(self) -> None:
+        '''
+        Writes the loaded documents to the snapshot, if any. Callers hold the lock.
+        '''
+        if self.snapshot_path is not None:
+            try:
+                helper.write_snapshot(self.snapshot_path, self._documents)
+            except OSError as e:
+                print(f"Could not write the craftable items snapshot: {e!r}")
+
+    def _share(self) -> None:
+        '''
+        Stores the loaded documents in the backend, if any. Callers hold the lock.
+        '''
+        if self.backend is not None:
+            self.backend.write(self.SHARED_KEY, self._documents, time.time(), self.poll_interval)
+
+    def _resolve(self, document: dict) -> CraftableRecipes:
+        recipes = {recipe_number: resolve_recipe(recipe, self.is_market_item)
+                   for recipe_number, recipe in document['all_recipes'].items()}
+        return CraftableRecipes(document['name'], document['category'], document['higher_grade'], recipes)
+
+    def _follow_changes(self) -> None:
+        '''
+        Applies changes to the collection as they happen. Falls back to reloading the whole collection every
+        poll_interval seconds if change streams are not available (they need a replica set, which Atlas provides).
+        The collection is loaded first if the store started from its snapshot, every RETRY_INTERVAL seconds until it is.
+        '''
+        while not self.fresh:
+            time.sleep(self.RETRY_INTERVAL)
+            try:
+                self.load()
+            except PyMongoError as e:
+                print(f"Could not load craftable items, keeping the local snapshot: {e!r}")
+
+        try:
+            with self.collection.watch(full_document='updateLookup') as stream:
+                for change in stream:
+                    self._apply_change(change)
+        except PyMongoError as e:
+            print(f"Recipe change stream unavailable, polling every {self.poll_interval:.0f} s instead: {e!r}")
+
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.load()
+            except PyMongoError as e:
+                print(f"Could not reload craftable items, keeping the loaded recipes: {e!r}")
+
+    def _apply_change(self, change: dict) -> None:
+        '''
+        Applies one change stream event to the store. The dicts are copied, changed and replaced, so that readers on the
+        event loop never see them change under them.
+        '''
+        if change['operationType'] not in ('insert', 'update', 'replace', 'delete'):
+            return
+
+        with self._lock:
+            documents, names, recipes = dict(self._documents), dict(self._names), dict(self._recipes)
+            _id = change['documentKey']['_id']
+            old_name = names.pop(_id, None)
+            if old_name is not None:
+                documents.pop(old_name, None)
+                recipes.pop(old_name, None)
+
+            document = change.get('fullDocument')
+            if change['operationType'] != 'delete' and document is not None:
+                document = {field: document[field] for field in ('_id', *PROJECTION)}
+                documents[document['name']] = document
+                names[_id] = document['name']
+                recipes[document['name']] = self._resolve(document)
+
+            self._documents, self._names = documents, names
+            if recipes != self._recipes:
+                self._recipes = recipes
+                self.changes += 1
+            self._share()
+            self._persist()
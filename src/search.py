@@ -1,5 +1,90 @@
-from helper import substring_in_string_percentage, enhancement_levels,\
-type_one, type_two, type_three, type_four, type_five
+from helper import substring_in_string_percentage, edit_distance, trigrams
+import heapq
+import helper
+
+
+class NameIndex:
+    """
+    Lookup tables of official item names, built once per name -> id dictionary.
+    """
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.version = helper.static_version # Static tables are replaced when revalidated, see helper
+        self.exact = {} # Lowercased name -> (id, name). The first of any names that only differ in case wins.
+        self.entries = [] # (name, id, lowercased name, token count), in the order of data
+        self.tokens = {} # Token of a lowercased name -> positions in entries of names containing that token
+        self.trigrams = {} # Trigram -> tokens containing it
+        self._token_matches = {} # Search term -> positions in entries of names containing it as a substring
+        self._closest_matches = {} # Search term -> positions in entries of names with a similar token -> similarity
+
+        for position, (name, id) in enumerate(data.items()):
+            lowered = name.lower()
+            tokens = lowered.split()
+            self.exact.setdefault(lowered, (id, name))
+            self.entries.append((name, id, lowered, len(tokens)))
+            for token in tokens:
+                self.tokens.setdefault(token, []).append(position)
+
+        for token in self.tokens:
+            for trigram in trigrams(token):
+                self.trigrams.setdefault(trigram, []).append(token)
+
+    def containing(self, term: str) -> set:
+        '''
+        Returns the positions of names that contain term as a substring.
+        term has no whitespace, so it can only be contained within a single token of a name. Only the (much smaller)
+        token vocabulary is scanned, and the result is memoized.
+        '''
+        positions = self._token_matches.get(term)
+        if positions is None:
+            positions = set()
+            for token, token_positions in self.tokens.items():
+                if term in token:
+                    positions.update(token_positions)
+
+            if len(self._token_matches) >= 4096:
+                self._token_matches.clear()
+            self._token_matches[term] = positions
+        return positions
+
+    def closest(self, term: str) -> dict:
+        '''
+        Returns the positions of names with a token similar to term, mapped to the similarity of their closest token
+        from 0 to 1. Names containing term are a perfect match. The result is memoized.
+        '''
+        closest = self._closest_matches.get(term)
+        if closest is None:
+            closest = dict.fromkeys(self.containing(term), 1.0)
+            for token, similarity in self.similar_tokens(term).items():
+                for position in self.tokens[token]:
+                    if similarity > closest.get(position, 0):
+                        closest[position] = similarity
+
+            if len(self._closest_matches) >= 4096:
+                self._closest_matches.clear()
+            self._closest_matches[term] = closest
+        return closest
+
+    def similar_tokens(self, term: str, limit: int=10, min_similarity: float=0.6) -> dict:
+        '''
+        Returns tokens similar to, but not containing term, mapped to their similarity from 0 to 1.
+        Up to limit tokens sharing the most trigrams with term are ranked by edit distance, which tolerates typos like
+        "vedaint" or "blckstar".
+        '''
+        shared = {}
+        for trigram in trigrams(term):
+            for token in self.trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+
+        similar = {}
+        for token in heapq.nlargest(limit, shared, key=shared.get):
+            longest = max(len(term), len(token))
+            if term in token or abs(len(term) - len(token)) > longest * (1 - min_similarity):
+                continue
+            similarity = 1 - edit_distance(term, token) / longest
+            if similarity >= min_similarity:
+                similar[token] = similarity
+        return similar
 
 
 class Search:
@@ -7,6 +92,11 @@ class Search:
     Attempts to find the name of the actual item based on user input.
     Based on the item name of best match, get its ID and SID. 
     """
+    def __init__(self) -> None:
+        self._indexes = {} # id(data) -> NameIndex of data
+        for data in (helper.all_name_to_id, helper.craftable_name_to_id):
+            self._get_index(data)
+
     def find_item(self, input: str, exact: bool, data: dict) -> dict:
         '''
         Takes in raw user input and extracts the intended search terms. 
@@ -25,24 +115,74 @@ class Search:
         '''
         Returns the internal enhancement number based on the enhancement level. Returns None if enhancement level is not specified.
         '''
-        if enhancement_level is None or len(response) == 1:
+        return self.sid_from_length(len(response), enhancement_level)
+
+    def sid_from_length(self, length: int, enhancement_level: str) -> int:
+        '''
+        Same as get_sid, given the length of the sublist instead of the sublist, e.g. from profiles.EnhancementProfiles.
+        length is not used if enhancement_level is None.
+        '''
+        if enhancement_level is None or length == 1:
             enhancement_level = None # In case someone specifies an enhancement level for an item that doesn't have enhancement levels
             sid = 0
 
-        elif enhancement_level in type_one.keys():
-            sid = type_one[enhancement_level] if len(response) > 10 else type_two[enhancement_level]
+        elif enhancement_level in helper.type_one.keys():
+            sid = helper.type_one[enhancement_level] if length > 10 else helper.type_two[enhancement_level]
 
-        elif enhancement_level in type_three.keys():
-            sid = type_three[enhancement_level]
+        elif enhancement_level in helper.type_three.keys():
+            sid = helper.type_three[enhancement_level]
 
-        elif enhancement_level in type_four.keys() and len(response) > 10:
-            sid = type_four[enhancement_level]
+        elif enhancement_level in helper.type_four.keys() and length > 10:
+            sid = helper.type_four[enhancement_level]
 
         else:
-            sid = type_five[enhancement_level]
+            sid = helper.type_five[enhancement_level]
         
         return sid
     
+    def suggest(self, input: str, data: dict, k: int=5) -> list:
+        '''
+        Returns up to k official item names closest to the raw user input, as (name, id, score) tuples, best first.
+        Unlike find_item, misspelled search terms still match, so that the bot can answer with "did you mean" suggestions.
+        The score ranges from 0 to 1 and is computed like substring_in_string_percentage, but every search term counts as
+        the similarity of the closest token of the name instead of 0 or 1.
+        '''
+        strings_list = self._get_item_search_term(input).lower().split()
+        if not strings_list:
+            return []
+
+        index = self._get_index(data)
+        similarities = {} # Position in entries -> sum of the best similarity of every search term
+        for string in strings_list:
+            for position, similarity in index.closest(string).items():
+                similarities[position] = similarities.get(position, 0) + similarity
+
+        entries = index.entries
+        def score(position: int) -> float:
+            similarity = similarities[position]
+            token_count = entries[position][3]
+            return (similarity / len(strings_list)) * 0.5 + (min(similarity, token_count) / token_count) * 0.5
+
+        best_positions = heapq.nlargest(k, similarities, key=lambda position: (score(position), -position))
+        return [(entries[position][0], entries[position][1], score(position)) for position in best_positions]
+
+    def did_you_mean(self, input: str, data: dict, k: int=5) -> list:
+        '''
+        Returns suggestions for the raw user input if find_item would have to guess, i.e. if some of the search terms
+        are not found in its best match. Returns an empty list if the best match contains every search term.
+        '''
+        item_search_term = self._get_item_search_term(input)
+        best_match_name = list(self._get_id_and_name(item_search_term, data).values())[0].lower()
+        if all(string in best_match_name for string in item_search_term.lower().split()):
+            return []
+        return [name for name, id, score in self.suggest(input, data, k)]
+
+    def is_market_item(self, name: str) -> bool:
+        '''
+        Returns whether name is the official name of an item in the market, ignoring case.
+        '''
+        return name.lower() in self._get_index(helper.all_name_to_id).exact
+
     def get_enhancement_level(self, input):
         '''
         Returns the enhancement level. If enhancement level is not specified by user, returns None.
@@ -63,7 +203,7 @@ class Search:
         check = input.split(" ")[0]
 
         # Check if the first substring is an enhancement level
-        for enhancement_level in enhancement_levels:
+        for enhancement_level in helper.enhancement_levels:
             if enhancement_level == check:
                 return enhancement_level
         
@@ -95,10 +235,42 @@ class Search:
     def _get_id_and_name(self, item_search_term: str, data: dict) -> dict:
         '''
         Gets id and name based on the best partially matched item based on item_search_term.
+        Only names sharing a token with item_search_term are scored, with the same score and tie-breaking as
+        _scan_id_and_name, i.e. the last name with the highest score wins.
+
         PARAMS:
         item_search_term: The search term to be compared with official item names.
         data: Contains official item names to be used in the initialization stage.
         '''
+        strings_list = item_search_term.lower().split()
+        if not strings_list:
+            return self._scan_id_and_name(item_search_term, data)
+
+        index = self._get_index(data)
+        substring_matches = {}
+        for string in strings_list:
+            for position in index.containing(string):
+                substring_matches[position] = substring_matches.get(position, 0) + 1
+
+        # Same as substring_in_string_percentage, using the precomputed name lengths and token counts
+        match_percent = 0
+        best_match_position = len(index.entries) - 1 # Nothing matched: the last name wins, as in a full scan
+        for position, matches in substring_matches.items():
+            _, _, lowered, token_count = index.entries[position]
+            if len(item_search_term) > len(lowered):
+                continue
+            percent = (matches / len(strings_list)) * 0.5 + (matches / token_count) * 0.5
+            if percent > match_percent or (percent == match_percent and position > best_match_position):
+                best_match_position = position
+                match_percent = percent
+
+        best_match_name, best_match_ID, _, _ = index.entries[best_match_position]
+        return {best_match_ID: best_match_name}
+
+    def _scan_id_and_name(self, item_search_term: str, data: dict) -> dict:
+        '''
+        Reference implementation of _get_id_and_name, scoring every name in data.
+        '''
         match_percent = 0
         for name, id in data.items():
             percent = substring_in_string_percentage(item_search_term, name.lower())
@@ -115,10 +287,22 @@ class Search:
         item_search_term: The search term to be compared with official item names.
         data: Contains official item names to be used in the initialization stage.
         '''
-        for name, id in data.items():
-            if item_search_term.lower() == name.lower():
-                return {id: name}
-        return {}
+        match = self._get_index(data).exact.get(item_search_term.lower())
+        if match is None:
+            return {}
+        id, name = match
+        return {id: name}
+
+    def _get_index(self, data: dict) -> NameIndex:
+        '''
+        Returns the index of data, building it on first use and whenever the static tables changed.
+        '''
+        index = self._indexes.get(id(data))
+        if index is None or index.version != helper.static_version:
+            self._indexes = {key: index for key, index in self._indexes.items() if index.version == helper.static_version}
+            index = NameIndex(data)
+            self._indexes[id(data)] = index
+        return index
     
     
 
@@ -0,0 +1,64 @@
+import aiohttp
+from collections import defaultdict
+from helper import TRADE_MARKET_URL, HEADERS
+
+
+class MarketSession:
+    """
+    Long-lived, pooled HTTP session that all async trade market calls go through.
+    Connections are kept alive between requests, so that consecutive lookups skip the TCP and TLS handshakes.
+
+    PARAMS:
+    pool_size: Maximum number of open connections to the trade market
+    keepalive_timeout: Seconds an idle connection is kept open for reuse
+    timeout: Seconds before a request is aborted
+    """
+    def __init__(self, pool_size: int=32, keepalive_timeout: float=60, timeout: float=10) -> None:
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session = None
+        self._stats = defaultdict(lambda: {'requests': 0, 'new_connections': 0, 'reused_connections': 0})
+
+    async def post(self, endpoint: str, payload: dict) -> bytes:
+        '''
+        POSTs payload to a trade market endpoint and returns the raw response body.
+        The session is created lazily, because aiohttp sessions must be created within a running event loop.
+        '''
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+
+        self._stats[endpoint]['requests'] += 1
+        async with self._session.post(f"{TRADE_MARKET_URL}/{endpoint}", json=payload,
+                                      trace_request_ctx={'endpoint': endpoint}) as response:
+            return await response.read()
+
+    def stats(self) -> dict:
+        '''
+        Returns per endpoint request counts, and how many of them opened a new connection or reused a pooled one.
+        '''
+        return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                         keepalive_timeout=self.keepalive_timeout,
+                                         ttl_dns_cache=300)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+        return aiohttp.ClientSession(headers=HEADERS,
+                                     connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                     trace_configs=[trace_config])
+
+    async def _on_connection_create_end(self, session, context, params) -> None:
+        self._stats[context.trace_request_ctx['endpoint']]['new_connections'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params) -> None:
+        self._stats[context.trace_request_ctx['endpoint']]['reused_connections'] += 1
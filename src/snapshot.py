@@ -0,0 +1,52 @@
+import numpy as np
+from array import array
+from typing import Union
+from parsers import SubListEntry, BiddingInfo
+
+
+class MarketSnapshot:
+    """
+    Market data of one enhancement level of an item at one point in time.
+    The price ladder is kept as parallel int64 columns instead of a dict per price point, and queried with NumPy.
+    """
+    __slots__ = ('id', 'sid', 'base_price', 'current_stock', 'total_trades', 'price_min', 'price_max',
+                 'last_sold_price', 'last_sold_time', 'prices', 'sellers', 'buyers')
+
+    def __init__(self, sid: int, entry: SubListEntry, bidding_info: BiddingInfo=None) -> None:
+        self.id = entry.id
+        self.sid = sid
+        self.base_price = entry.base_price
+        self.current_stock = entry.current_stock
+        self.total_trades = entry.total_trades
+        self.price_min = entry.price_min
+        self.price_max = entry.price_max
+        self.last_sold_price = entry.last_sold_price
+        self.last_sold_time = entry.last_sold_time
+        self.prices, self.sellers, self.buyers = bidding_info if bidding_info is not None else (array('q'), array('q'), array('q'))
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def min_listed(self) -> tuple[Union[int, None], Union[int, None]]:
+        '''
+        Returns the minimum price that the item is listed at (within the price cap), and the quantity listed at that price.
+        Returns (None, None) if nothing is listed.
+        '''
+        prices, sellers = np.frombuffer(self.prices, dtype=np.int64), np.frombuffer(self.sellers, dtype=np.int64)
+        candidates = np.flatnonzero((sellers != 0) & (prices <= self.price_max))
+        if not len(candidates):
+            return None, None
+        best = candidates[::-1][np.argmin(prices[candidates[::-1]])] # The last of equal prices wins
+        return int(prices[best]), int(sellers[best])
+
+    def max_bid(self) -> tuple[Union[int, None], Union[int, None]]:
+        '''
+        Returns the greatest price that there are buy orders at (within the price cap), and the amount of buy orders.
+        Returns (None, None) if there are no buy orders.
+        '''
+        prices, buyers = np.frombuffer(self.prices, dtype=np.int64), np.frombuffer(self.buyers, dtype=np.int64)
+        candidates = np.flatnonzero((buyers != 0) & (prices >= self.price_min))
+        if not len(candidates):
+            return None, None
+        best = candidates[::-1][np.argmax(prices[candidates[::-1]])] # The last of equal prices wins
+        return int(prices[best]), int(buyers[best])
@@ -0,0 +1,205 @@
+'''
+Buy or craft solver. Many ingredients are craftable themselves, and can be cheaper to craft than to buy. The solver
+finds the cheapest way to obtain every ingredient over the whole recipe graph, given one snapshot of prices.
+'''
+from typing import NamedTuple, Union
+import helper
+import crafting
+from recipes import VENDOR, DROP
+
+
+BUY = 'buy'
+CRAFT = 'craft'
+
+
+class Step(NamedTuple):
+    '''
+    How to obtain quantity of an item: BUY it on the market, CRAFT it, buy it from a VENDOR, or get it as a DROP.
+    unit_cost is the cost of one item; crafted items have the recipe used and a Step per ingredient of one craft.
+    '''
+    name: str
+    quantity: float
+    action: str
+    unit_cost: float
+    recipe_number: Union[str, None]=None
+    ingredients: tuple=()
+
+
+def market_ingredients(recipes: dict, name: str) -> set:
+    '''
+    Returns the names of the market items among the ingredients of name, and of the ingredients of every craftable
+    ingredient, recursively.
+    '''
+    found, seen, pending = set(), {name}, [name]
+    while pending:
+        for recipe in recipes[pending.pop()].recipes.values():
+            for ingredient in recipe.ingredients:
+                if ingredient.kind not in (VENDOR, DROP):
+                    found.add(ingredient.name)
+                if ingredient.name in recipes and ingredient.name not in seen:
+                    seen.add(ingredient.name)
+                    pending.append(ingredient.name)
+    return found
+
+
+class CraftingSolver:
+    """
+    Cheapest cost of every item over the recipe graph, memoized per (item, mastery).
+    One unit of a craftable item costs the lower of its market price and the cost of its cheapest recipe divided by the
+    regular items one craft yields at mastery (see crafting.value_coefficients). Items crafted from each other form a
+    cycle of the recipe graph (a strongly connected component), which is solved at once, whichever item of it is asked
+    for first: every item of a cycle of n items is crafted from the others at most n times nested, the innermost craft
+    buying its ingredients. Crafting deeper would only pay off through yields above 1 per ingredient, which are averages.
+
+    PARAMS:
+    recipes: name -> recipes.CraftableRecipes of every craftable item
+    prices: name -> market price of every market item that may be needed. Items without a price cannot be bought.
+    """
+    def __init__(self, recipes: dict, prices: dict) -> None:
+        self.recipes = recipes
+        self.prices = prices
+        self._unit_costs = {} # (name, mastery) -> (unit cost, action, recipe number)
+        self._craft_costs = {} # (name, mastery) -> (cost of one craft, recipe number)
+
+    def unit_cost(self, name: str, mastery: str) -> tuple[float, str, Union[str, None]]:
+        '''
+        Returns the cheapest cost of one unit of a market or craftable item, how to get it (BUY or CRAFT) and the recipe.
+        The cost is infinite if the item can neither be bought nor crafted.
+        '''
+        key = (name, mastery)
+        if key not in self._unit_costs:
+            if name in self.recipes:
+                self._solve(name, mastery)
+            else:
+                self._unit_costs[key] = (self.prices.get(name, float('inf')), BUY, None)
+        return self._unit_costs[key]
+
+    def craft_cost(self, name: str, mastery: str) -> tuple[float, Union[str, None]]:
+        '''
+        Returns the cost of one craft of name with its cheapest recipe, every ingredient being bought or crafted,
+        whichever is cheaper, and the recipe. Equally cheap recipes resolve to the first one.
+        '''
+        key = (name, mastery)
+        if key not in self._craft_costs:
+            self._solve(name, mastery)
+        return self._craft_costs[key]
+
+    def tree(self, name: str, mastery: str, quantity: float=1) -> Step:
+        '''
+        Returns the cheapest way to craft quantity crafts of name, as a tree of Steps. The root is always crafted.
+        '''
+        cost, recipe_number = self.craft_cost(name, mastery)
+        return Step(name, quantity, CRAFT, cost, recipe_number, self._ingredient_steps(name, recipe_number, mastery, quantity, {name}))
+
+    def _craftable_ingredients(self, name: str) -> list:
+        '''
+        Returns the craftable ingredients of every recipe of name, the edges of the recipe graph.
+        '''
+        return list(dict.fromkeys(ingredient.name for recipe in self.recipes[name].recipes.values()
+                                  for ingredient in recipe.ingredients
+                                  if ingredient.kind != VENDOR and ingredient.name in self.recipes))
+
+    def _solve(self, name: str, mastery: str) -> None:
+        '''
+        Solves every unsolved craftable item that name leads to, one strongly connected component at a time, ingredients
+        first (Tarjan's algorithm, without recursion so that deep recipe chains do not hit the recursion limit).
+        '''
+        index, low, stack, on_stack = {name: 0}, {name: 0}, [name], {name}
+        work = [(name, iter(self._craftable_ingredients(name)))]
+        while work:
+            node, ingredients = work[-1]
+            for ingredient in ingredients:
+                if (ingredient, mastery) in self._craft_costs:
+                    continue
+                if ingredient not in index:
+                    index[ingredient] = low[ingredient] = len(index)
+                    stack.append(ingredient)
+                    on_stack.add(ingredient)
+                    work.append((ingredient, iter(self._craftable_ingredients(ingredient))))
+                    break
+                if ingredient in on_stack:
+                    low[node] = min(low[node], index[ingredient])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while not component or component[-1] != node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    self._solve_component(component, mastery)
+
+    def _solve_component(self, component: list, mastery: str) -> None:
+        '''
+        Solves the items of a strongly connected component whose ingredients outside of it are solved. The costs of a
+        cycle are relaxed once per item of it, from the market prices: each round crafts one level deeper.
+        '''
+        cyclic = len(component) > 1 or component[0] in self._craftable_ingredients(component[0])
+        costs = {name: (self.prices.get(name, float('inf')), BUY, None) for name in component}
+        for _ in range(len(component) if cyclic else 1):
+            crafts = {name: self._cheapest_recipe(name, mastery, costs) for name in component}
+            costs = {name: self._unit_cost_of(name, mastery, *crafts[name]) for name in component}
+
+        for name in component:
+            self._craft_costs[(name, mastery)] = crafts[name]
+            self._unit_costs[(name, mastery)] = costs[name]
+
+    def _cheapest_recipe(self, name: str, mastery: str, costs: dict) -> tuple[float, Union[str, None]]:
+        '''
+        Returns the cost of one craft of name with its cheapest recipe, and the recipe. costs holds the unit costs of the
+        items of the component of name, the ingredients outside of it are solved.
+        '''
+        best = (float('inf'), None)
+        for recipe_number, recipe in self.recipes[name].recipes.items():
+            cost = sum(float(ingredient.quantity) * (costs[ingredient.name][0] if ingredient.name in costs else
+                                                     self._ingredient_cost(ingredient, mastery)[0])
+                       for ingredient in recipe.ingredients)
+            if best[1] is None or cost < best[0]:
+                best = (cost, recipe_number)
+        return best
+
+    def _unit_cost_of(self, name: str, mastery: str, craft_cost: float,
+                      recipe_number: Union[str, None]) -> tuple[float, str, Union[str, None]]:
+        '''
+        Returns the unit cost of name, how to get it and the recipe, given the cost of one craft with recipe_number.
+        '''
+        best = (self.prices.get(name, float('inf')), BUY, None)
+        regular_yield = crafting.value_coefficients(self.recipes[name].category, name, mastery)[0]
+        if regular_yield > 0 and craft_cost / regular_yield < best[0]:
+            best = (craft_cost / regular_yield, CRAFT, recipe_number)
+        return best
+
+    def _ingredient_cost(self, ingredient, mastery: str) -> tuple[float, str, Union[str, None]]:
+        '''
+        Returns the unit cost of an ingredient, how to get it and the recipe. Ingredients that are not on the market are
+        DROPs, free, unless they are craftable: those are crafted, having no market price to be bought at.
+        '''
+        if ingredient.kind == VENDOR:
+            return helper.static_items[ingredient.name], VENDOR, None
+        if ingredient.kind == DROP and ingredient.name not in self.recipes:
+            return 0, DROP, None
+        return self.unit_cost(ingredient.name, mastery)
+
+    def _ingredient_steps(self, name: str, recipe_number: Union[str, None], mastery: str, crafts: float, path: set) -> tuple:
+        '''
+        Returns the Steps of the ingredients of crafts crafts of name with recipe_number. path holds the items being
+        crafted above, which are bought instead of crafted again.
+        '''
+        if recipe_number is None:
+            return ()
+
+        steps = []
+        for ingredient in self.recipes[name].recipes[recipe_number].ingredients:
+            quantity = float(ingredient.quantity) * crafts
+            unit_cost, action, ingredient_recipe = self._ingredient_cost(ingredient, mastery)
+            if action == CRAFT and ingredient.name in path:
+                unit_cost, action, ingredient_recipe = self.prices.get(ingredient.name, float('inf')), BUY, None
+
+            ingredients = ()
+            if action == CRAFT:
+                regular_yield = crafting.value_coefficients(self.recipes[ingredient.name].category, ingredient.name, mastery)[0]
+                ingredients = self._ingredient_steps(ingredient.name, ingredient_recipe, mastery, quantity / regular_yield,
+                                                     path | {ingredient.name})
+            steps.append(Step(ingredient.name, quantity, action, unit_cost, ingredient_recipe, ingredients))
+        return tuple(steps)
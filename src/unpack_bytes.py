@@ -1,6 +1,7 @@
 import io
 import os
 import struct
+import functools
 from collections import Counter
 from bitstring import BitArray
 import requests
@@ -118,6 +119,110 @@ def decode(tree, freqs, packed, bits, verbose=False, check_stats=False):
     return unpacked
 
 
+def make_decode_table(tree):
+    '''
+    Precomputes a byte at a time decoding table from a tree built by make_tree.
+    Every internal node of the tree is a decoding state, the root being state 0. table[state][byte] is the tuple
+    (decoded chars, next state) of walking the 8 bits of byte (most significant bit first) from that state,
+    or None if the walk hits a dead end.
+    '''
+    nodes = []
+    states = {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node is None or (node.left is None and node.right is None):
+            continue
+        states[id(node)] = len(nodes)
+        nodes.append(node)
+        stack += [node.right, node.left]
+
+    # Walk every nibble from every state, then chain two nibbles into a byte
+    nibbles = []
+    for start in nodes:
+        row = []
+        for nibble in range(16):
+            node = start
+            chars = ''
+            for shift in range(3, -1, -1):
+                node = node.right if nibble >> shift & 1 else node.left
+                if node is None:
+                    break
+                if node.left is None and node.right is None:
+                    chars += node.c
+                    node = tree
+            row.append(None if node is None else (chars, states[id(node)]))
+        nibbles.append(row)
+
+    table = []
+    for row in nibbles:
+        byte_row = []
+        for high in row:
+            if high is None:
+                byte_row += [None] * 16
+                continue
+            chars, state = high
+            byte_row += [None if low is None else (chars + low[0], low[1]) for low in nibbles[state]]
+        table.append(byte_row)
+
+    return nodes, table
+
+
+def decode_table(tree, freqs, packed, bits, table=None, check_stats=False, chars=None):
+    '''
+    Table driven equivalent of decode: decodes a whole byte per lookup, working on the raw bytes.
+    table is the result of make_decode_table(tree); it is built if not given.
+    If tree is a shape tree (see make_shape_tree), chars is the char of every leaf, by leaf number.
+    '''
+    names = None if chars is None else dict(enumerate(map(ord, chars)))
+    def text(chunks):
+        unpacked = ''.join(chunks)
+        return unpacked if names is None else unpacked.translate(names)
+
+    if tree.left is None and tree.right is None:
+        # A tree of a single char has no codes: the reference decoder dead ends on the first bit
+        if bits > 0 and packed:
+            raise ValueError("invalid tree: dead end while walking, unpacked=''")
+        return ''
+
+    nodes, table = table if table is not None else make_decode_table(tree)
+    bits = min(bits, len(packed) * 8)
+    full_bytes, remaining_bits = divmod(bits, 8)
+
+    chunks = []
+    state = 0
+    for byte in packed[:full_bytes]:
+        entry = table[state][byte]
+        if entry is None:
+            raise ValueError(f"invalid tree: dead end while walking, unpacked={text(chunks)!r}")
+        decoded, state = entry
+        chunks.append(decoded)
+
+    if remaining_bits:
+        node = nodes[state]
+        byte = packed[full_bytes]
+        for shift in range(7, 7 - remaining_bits, -1):
+            node = node.right if byte >> shift & 1 else node.left
+            if node is None:
+                raise ValueError(f"invalid tree: dead end while walking, unpacked={text(chunks)!r}")
+            if node.left is None and node.right is None:
+                chunks.append(node.c)
+                node = tree
+        state = 0 if node is tree else nodes.index(node)
+
+    unpacked = text(chunks)
+    if state != 0:
+        raise ValueError(f'invalid tree: out of message bounds, {unpacked=}')
+
+    if check_stats:
+        stats = Counter(unpacked)
+        for c, f in freqs.items():
+            if stats[c] != f:
+                raise ValueError(f"incorrect '{c}' freq: header={f} processed={stats[c]}, {unpacked=}")
+
+    return unpacked
+
+
 def read(file, fmt):
     i = struct.calcsize(fmt)
 
@@ -137,22 +242,121 @@ def get_freqs(file):
     return freqs
 
 
-def unpack_file(file):
-    freqs = get_freqs(file)
-    tree = make_tree(freqs)
+def read_freq_header(file):
+    '''
+    Reads the raw frequency table: one (count, char) entry of 8 bytes per char.
+    '''
+    file_len, always0, chars_count = read(file, 'III')
+    return file.read(chars_count * struct.calcsize('Icxxx'))
+
+
+def tree_shape(tree):
+    '''
+    Returns the depth of every leaf of a tree from left to right, and the chars of the leaves in the same order.
+    Trees of the same shape decode the same bits into the same leaves, whatever chars the leaves hold.
+    '''
+    depths = []
+    chars = ''
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.left is None and node.right is None:
+            depths.append(depth)
+            chars += node.c
+            continue
+        stack += [(node.right, depth + 1), (node.left, depth + 1)]
+    return tuple(depths), chars
+
+
+def make_shape_tree(depths):
+    '''
+    Builds the tree whose leaves have depths, from left to right. Leaf i holds chr(i) instead of a char.
+    '''
+    leaves = iter(enumerate(depths))
+    def build(depth, leaf):
+        if leaf[1] == depth:
+            return Node(chr(leaf[0]), 0), next(leaves, None)
+        left, leaf = build(depth + 1, leaf)
+        right, leaf = build(depth + 1, leaf)
+        return Node(left.c + right.c, 0, left, right), leaf
+    return build(0, next(leaves))[0]
+
+
+def get_decoder(freq_header):
+    '''
+    Returns (freqs, tree, decode table, chars) of a raw frequency table, parsed in a single pass. tree is a shape tree,
+    chars the char of each of its leaves (see decode_table).
+    Frequency tables rarely repeat, as they count the digits of every price, but with a dozen chars the trees they make
+    only take a few dozen shapes. Decode tables are cached by shape (see get_shape_decoder), so that most decodes skip
+    building one.
+    '''
+    freqs = {char.decode('ascii'): count for count, char in struct.iter_unpack('Icxxx', memoryview(freq_header))}
+    depths, chars = tree_shape(make_tree(freqs))
+    tree, table = get_shape_decoder(depths)
+    return freqs, tree, table, chars
+
+
+@functools.lru_cache(maxsize=256)
+def get_shape_decoder(depths):
+    '''
+    Returns the shape tree of the leaf depths and its decode table.
+    '''
+    tree = make_shape_tree(depths)
+    table = make_decode_table(tree) if tree.left is not None or tree.right is not None else None
+    return tree, table
+
+
+def unpack_file(file, fast=True):
+    if not fast:
+        freqs = get_freqs(file)
+        tree = make_tree(freqs)
+        packed_bits, packed_bytes, unpacked_bytes = read(file, 'III')
+        packed = file.read(packed_bytes)
+        return decode(tree, freqs, packed, packed_bits)
+
+    freqs, tree, table, chars = get_decoder(read_freq_header(file))
 
     packed_bits, packed_bytes, unpacked_bytes = read(file, 'III')
 
     packed = file.read(packed_bytes)
-    result = decode(tree, freqs, packed, packed_bits)
-    return result
+    return decode_table(tree, freqs, packed, packed_bits, table, chars=chars)
 
 
-def unpack(data):
+def unpack(data, fast=True):
+    '''
+    Decodes a Huffman packed API response. fast=False uses the bit by bit reference decoder.
+    '''
     if type(data) == bytes:
         data = io.BytesIO(data)
 
-    return unpack_file(data)
+    return unpack_file(data, fast)
+
+
+def pack(text):
+    '''
+    Huffman packs text in the same format as the API responses, i.e. the inverse of unpack.
+    Used to generate payloads for tests and benchmarks.
+    '''
+    freqs = dict(Counter(text))
+    tree = make_tree(freqs)
+
+    codes = {}
+    stack = [(tree, '')]
+    while stack:
+        node, code = stack.pop()
+        if node.left is None and node.right is None:
+            codes[node.c] = code
+            continue
+        stack += [(node.left, code + '0'), (node.right, code + '1')]
+
+    bit_string = ''.join(codes[c] for c in text)
+    packed_bytes = (len(bit_string) + 7) // 8
+    packed = int(bit_string.ljust(packed_bytes * 8, '0') or '0', 2).to_bytes(packed_bytes, 'big')
+
+    body = b''.join(struct.pack('I', f) + struct.pack('cxxx', c.encode('ascii')) for c, f in freqs.items())
+    body += struct.pack('III', len(bit_string), packed_bytes, len(text)) + packed
+    header = struct.pack('III', 12 + len(body), 0, len(freqs))
+    return header + body
 
 if __name__ == '__main__':
     '''
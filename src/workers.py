@@ -0,0 +1,155 @@
+'''
+Process pool for the CPU bound stages of commands: decoding large trade market responses, fuzzy item search and
+rebuilding the profit leaderboard. They run in worker processes instead of on the event loop thread, so that one
+command does not stall the commands of every other server.
+Every worker loads the static tables from the local snapshot once, when it starts (see helper.read_snapshot), so that
+tasks only carry their own arguments. Workers reload the snapshot when the static tables of the bot changed.
+'''
+import asyncio, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Union
+import helper
+
+
+OFFLOAD_MIN_BYTES = 4096 # Smaller responses are parsed inline: sending them to a worker costs more than parsing them
+
+
+# State of a worker process
+_snapshot_path = None
+_static_version = None # helper.static_version of the bot that _tables match
+_search = None # Search with the indexes of the static tables built
+
+
+def _start_worker(snapshot_path: str, static_version: int) -> None:
+    '''
+    Initializer of every worker process: installs the static tables from the snapshot and builds the search indexes.
+    '''
+    global _snapshot_path, _static_version, _search
+    _snapshot_path = snapshot_path
+    tables = helper.read_snapshot(snapshot_path)
+    if tables is not None: # Otherwise helper loads them on first use, as in the bot
+        helper.install_static(tables)
+    _static_version = static_version
+
+    from search import Search # Builds its indexes when created, once the tables are installed
+    _search = Search()
+
+def _sync_static(static_version: int) -> None:
+    '''
+    Reloads the static tables from the snapshot if the tables of the bot changed since they were loaded.
+    '''
+    global _static_version
+    if static_version == _static_version:
+        return
+    fresh = helper.read_snapshot(_snapshot_path)
+    if fresh is not None:
+        helper.install_static(fresh) # Rebuilds the search indexes and the static arrays derived from the tables
+    _static_version = static_version
+
+def _call(static_version: int, function: Callable, args: tuple) -> Any:
+    _sync_static(static_version)
+    return function(*args)
+
+def _find_item(input: str, table: str) -> dict:
+    return _search.find_item(input, False, getattr(helper, table))
+
+def _did_you_mean(input: str, table: str, k: int) -> list:
+    return _search.did_you_mean(input, getattr(helper, table), k)
+
+def _ready() -> None:
+    pass
+
+
+class WorkerPool:
+    """
+    Warm pool of worker processes for CPU bound work. Until it is started, or with 0 workers, every task runs inline.
+
+    PARAMS:
+    workers: Number of worker processes
+    """
+    def __init__(self, workers: int=0) -> None:
+        self.workers = workers
+        self.tasks = 0 # Tasks run in a worker
+        self._executor = None
+
+    def start(self) -> None:
+        '''
+        Starts every worker, and waits until one has loaded the static tables. Does nothing with 0 workers.
+        '''
+        if self.workers <= 0 or self._executor is not None:
+            return
+        helper.load_static() # Writes the snapshot the workers load if there is none yet
+        self._create_executor()
+        for future in [self._executor.submit(_ready) for _ in range(self.workers)]: # One process is spawned per task
+            future.result()
+        print(f"Started {self.workers} worker processes")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def run(self, function: Callable, *args) -> Any:
+        '''
+        Runs function(*args) in a worker, or inline if the pool is not started. function must be a module level function,
+        and args and the result must be picklable.
+        If a worker died, the workers are replaced and the task is run once more.
+        '''
+        if self._executor is None:
+            return function(*args)
+
+        self.tasks += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, _call, helper.static_version, function, args)
+        except BrokenProcessPool as e:
+            print(f"Worker pool broken, restarting it: {e!r}")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._create_executor()
+            return await loop.run_in_executor(self._executor, _call, helper.static_version, function, args)
+
+    async def parse(self, parser: Callable[[bytes], Any], response: bytes) -> Any:
+        '''
+        Returns parser(response), parsed in a worker if response is at least OFFLOAD_MIN_BYTES long.
+        '''
+        if len(response) < OFFLOAD_MIN_BYTES:
+            return parser(response)
+        return await self.run(parser, response)
+
+    async def find_item(self, search, input: str, exact: bool, data: dict) -> dict:
+        '''
+        Same as search.find_item(input, exact, data), scored in a worker. Exact matches are a dict lookup and are found
+        inline, as are matches in tables that are not static tables.
+        '''
+        table = self._table_name(data)
+        if self._executor is None or exact or table is None:
+            return search.find_item(input, exact, data)
+        return await self.run(_find_item, input, table)
+
+    async def did_you_mean(self, search, input: str, data: dict, k: int=5) -> list:
+        '''
+        Same as search.did_you_mean(input, data, k), scored in a worker.
+        '''
+        table = self._table_name(data)
+        if self._executor is None or table is None:
+            return search.did_you_mean(input, data, k)
+        return await self.run(_did_you_mean, input, table, k)
+
+    def _create_executor(self) -> None:
+        # Workers are spawned rather than forked, so that they do not inherit the threads and sockets of the bot
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_start_worker,
+                                             initargs=(helper.STATIC_SNAPSHOT_PATH, helper.static_version))
+
+    def _table_name(self, data: dict) -> Union[str, None]:
+        '''
+        Returns the helper attribute of the static table data, or None if data is not a static table.
+        '''
+        for attribute in ('all_name_to_id', 'craftable_name_to_id'):
+            if getattr(helper, attribute) is data:
+                return attribute
+        return None
+
+
+pool = WorkerPool(int(os.getenv('WORKERS', 0)))
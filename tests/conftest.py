@@ -0,0 +1,4 @@
+import os, sys
+
+# Modules of the bot import each other by name, from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
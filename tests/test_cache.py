@@ -0,0 +1,107 @@
+import asyncio, time
+import pytest
+from cache import TTLCache, MemoryBackend, RedisBackend
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def shared_caches(count: int, ttl: float=60, stale_ttl: float=240) -> list:
+    '''
+    Returns count caches sharing one fake Redis server, as the caches of count processes would.
+    '''
+    server = fakeredis.FakeServer()
+    return [TTLCache(ttl, stale_ttl, backend=RedisBackend(fakeredis.FakeRedis(server=server), 'test')) for _ in range(count)]
+
+
+class Fetcher:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, name: str, key: tuple):
+        async def fetch():
+            self.calls.append((name, key))
+            await asyncio.sleep(0.01)
+            return [key, name]
+        return fetch
+
+
+def test_entries_are_shared_between_processes():
+    a, b = shared_caches(2)
+    fetcher = Fetcher()
+
+    async def main():
+        first = await a.get_or_fetch((5,), fetcher('a', (5,)))
+        second = await b.get_or_fetch((5,), fetcher('b', (5,)))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == [(5,), 'a']
+    assert fetcher.calls == [('a', (5,))]
+    assert b.stats()['hits'] == 1
+
+
+def test_only_one_process_refreshes_a_stale_entry():
+    a, b = shared_caches(2, ttl=0.1, stale_ttl=10)
+    fetcher = Fetcher()
+
+    async def main():
+        await a.get_or_fetch((5,), fetcher('a', (5,)))
+        await asyncio.sleep(0.15)
+        await asyncio.gather(a.get_or_fetch((5,), fetcher('a', (5,))), b.get_or_fetch((5,), fetcher('b', (5,))))
+        await asyncio.sleep(0.05) # Background refresh
+
+    asyncio.run(main())
+    assert len(fetcher.calls) == 2
+    assert a.stats()['stale_hits'] == b.stats()['stale_hits'] == 1
+
+
+def test_values_round_trip():
+    a, b = shared_caches(2)
+
+    async def main():
+        await a.set((1, 2), {'prices': (1, 2, 3)})
+        return await b.backend.get((1, 2))
+
+    value, stored_at = asyncio.run(main())
+    assert value == {'prices': (1, 2, 3)}
+    assert abs(stored_at - time.time()) < 5
+
+
+class Down:
+    '''
+    Client of a Redis that cannot be reached.
+    '''
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get(self, *args, **kwargs):
+        self.calls += 1
+        raise TimeoutError("Timeout reading from socket")
+
+    set = get
+
+
+def test_unavailable_redis_misses_and_is_skipped():
+    client = Down()
+    cache = TTLCache(backend=RedisBackend(client, 'test', retry_after=60))
+    fetcher = Fetcher()
+
+    async def main():
+        return [await cache.get_or_fetch((id,), fetcher('a', (id,))) for id in range(3)]
+
+    assert asyncio.run(main()) == [[(id,), 'a'] for id in range(3)]
+    assert len(fetcher.calls) == 3
+    assert client.calls == 1 # Skipped after the first failure
+
+
+def test_memory_backend_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2)
+
+    async def main():
+        for key in 'abc':
+            await cache.set(key, key)
+        return await cache.backend.get('a'), await cache.backend.get('c')
+
+    assert asyncio.run(main()) == (None, ('c', pytest.approx(time.time(), abs=5)))
+    assert len(cache) == 2
+    assert isinstance(cache.backend, MemoryBackend)
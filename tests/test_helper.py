@@ -0,0 +1,52 @@
+import helper
+
+
+def test_importing_does_not_connect_to_mongodb():
+    namespace = {}
+    exec("from helper import *", namespace)
+    assert 'items' not in namespace and 'misc_data' not in namespace
+    assert isinstance(helper.items, helper.LazyCollection)
+    assert helper.get_mongo_client.cache_info().currsize == 0
+
+
+def test_revalidation_installs_fresh_tables(monkeypatch, tmp_path):
+    loaded = {'key': {'Black Stone': 1}, 'static_items': {'Salt': 20}}
+    fresh = {'key': {'Black Stone': 1, 'Memory Fragment': 2}, 'static_items': {'Salt': 20}}
+    monkeypatch.setattr(helper, '_static', loaded)
+    monkeypatch.setattr(helper, 'static_version', 0)
+    monkeypatch.setattr(helper, 'STATIC_SNAPSHOT_PATH', str(tmp_path / 'static_tables.snapshot'))
+    monkeypatch.setattr(helper, 'fetch_static', lambda: fresh)
+
+    before = helper.all_name_to_id
+    helper.revalidate_static(loaded)
+
+    assert before == {'Black Stone': 1} # Tables in use are never modified
+    assert helper.all_name_to_id is fresh['key']
+    assert helper.static_version == 1
+    assert helper.read_snapshot(helper.STATIC_SNAPSHOT_PATH) == fresh
+
+
+def test_unchanged_tables_are_kept(monkeypatch, tmp_path):
+    loaded = {'key': {'Black Stone': 1}}
+    monkeypatch.setattr(helper, '_static', loaded)
+    monkeypatch.setattr(helper, 'static_version', 0)
+    monkeypatch.setattr(helper, 'STATIC_SNAPSHOT_PATH', str(tmp_path / 'static_tables.snapshot'))
+    monkeypatch.setattr(helper, 'fetch_static', lambda: {'key': {'Black Stone': 1}})
+
+    helper.revalidate_static(loaded)
+    assert helper.load_static() is loaded and helper.static_version == 0
+
+
+def test_snapshot_is_written_before_the_version_is_bumped(monkeypatch, tmp_path):
+    loaded, fresh = {'key': {'Black Stone': 1}}, {'key': {'Black Stone': 1, 'Memory Fragment': 2}}
+    monkeypatch.setattr(helper, '_static', loaded)
+    monkeypatch.setattr(helper, 'static_version', 0)
+    monkeypatch.setattr(helper, 'STATIC_SNAPSHOT_PATH', str(tmp_path / 'static_tables.snapshot'))
+    monkeypatch.setattr(helper, 'fetch_static', lambda: fresh)
+    install_static = helper.install_static
+    seen = []
+    monkeypatch.setattr(helper, 'install_static', lambda data: seen.append(helper.read_snapshot(helper.STATIC_SNAPSHOT_PATH))
+                        or install_static(data))
+
+    helper.revalidate_static(loaded)
+    assert seen == [fresh] # A worker that sees the new version reloads the new tables
@@ -0,0 +1,32 @@
+from history import PriceHistory, RESOLUTIONS, FINEST, POLL_INTERVAL, DAILY
+from parsers import SubListEntry
+
+
+def entry(base_price: int) -> SubListEntry:
+    return SubListEntry(44195, 0, 0, base_price, 1, 2, base_price, base_price, base_price, 0)
+
+
+def test_finest_resolution_has_a_slot_per_pass():
+    assert FINEST == int(POLL_INTERVAL) and FINEST * RESOLUTIONS[FINEST] <= DAILY
+    history = PriceHistory(':memory:')
+    start = 1000 * DAILY
+    passes = RESOLUTIONS[FINEST]
+    for i in range(passes):
+        history.record([(0, entry(i))], start + i * FINEST)
+    points = history.series(44195, 0, FINEST, start + (passes - 1) * FINEST)
+    assert [point.base_price for point in points] == list(range(passes))
+
+
+def test_points_hold_the_last_snapshot_of_their_bucket():
+    history = PriceHistory(':memory:', {3600: 24})
+    start = 1000 * DAILY
+    for i, price in enumerate((100, 200, 300)):
+        history.record([(0, entry(price))], start + i * 600)
+    assert history.series(44195, 0, 3600, start) == [(start, 300, 1, 2, 300)]
+
+
+def test_all_series_reads_every_resolution():
+    history = PriceHistory(':memory:', {3600: 24, DAILY: 7})
+    history.record([(0, entry(100))], 1000 * DAILY)
+    assert history.all_series(44195, 0, 1000 * DAILY) == {3600: [(1000 * DAILY, 100, 1, 2, 100)],
+                                                          DAILY: [(1000 * DAILY, 100, 1, 2, 100)]}
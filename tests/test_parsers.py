@@ -0,0 +1,59 @@
+import ast, os
+import pytest
+from unpack_bytes import unpack
+from parsers import SubListEntry, parse_world_market_sub_list, parse_bidding_info_list, parse_market_price_info,\
+    parse_world_market_list
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Fields of a sublist entry as the bot named them before typed records (response_data_structure), by position
+SUB_LIST_FIELDS = ['mainKey', 'minEnhance', 'maxEnhance', 'basePrice', 'currentStock', 'totalTradeCount', 'priceMin',
+                   'priceMax', 'lastSoldPrice', 'lastSoldTime']
+
+
+def fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+
+# The parsing the bot did before parsers.py: literal_eval or unpack, then splitting into dicts
+def old_sub_list(response: bytes) -> list:
+    entries = ast.literal_eval(response.decode())['resultMsg'].split('|')[:-1]
+    return [{SUB_LIST_FIELDS[i]: int(info) for i, info in enumerate(entry.split('-'))} for entry in entries]
+
+def old_bidding_info(response: bytes) -> list:
+    price_points = [price_point.split('-') for price_point in unpack(response).split('|')[:-1]]
+    return [{'price': int(p[0]), 'sellers': int(p[1]), 'buyers': int(p[2])} for p in price_points]
+
+def old_records(records: str) -> list:
+    return [[int(field) for field in record.split('-')] for record in records.split('|') if record]
+
+
+@pytest.mark.parametrize('name', ['GetWorldMarketSubList_44195.json', 'GetWorldMarketSubList_11607.json'])
+def test_sub_list(name):
+    response = fixture(name)
+    entries = parse_world_market_sub_list(response)
+    assert all(isinstance(entry, SubListEntry) for entry in entries)
+    assert [dict(zip(SUB_LIST_FIELDS, entry)) for entry in entries] == old_sub_list(response)
+    assert [entry.enhancement_min for entry in entries] == list(range(len(entries)))
+
+
+def test_bidding_info():
+    response = fixture('GetBiddingInfoList_44195_0.bin')
+    bidding_info = parse_bidding_info_list(response)
+    # As Item.bidding_info builds them
+    assert [{'price': price, 'sellers': sellers, 'buyers': buyers} for price, sellers, buyers in zip(*bidding_info)] == \
+        old_bidding_info(response)
+    assert bidding_info.prices.typecode == 'q'
+
+
+def test_market_price_info():
+    response = fixture('GetMarketPriceInfo_44195_0.json')
+    assert list(parse_market_price_info(response)) == old_records(ast.literal_eval(response.decode())['resultMsg'])[0]
+
+
+@pytest.mark.parametrize('name', ['GetWorldMarketList_25_1.json', 'GetWorldMarketList_25_1.bin'])
+def test_world_market_list(name):
+    response = fixture(name)
+    records = unpack(response) if name.endswith('.bin') else ast.literal_eval(response.decode())['resultMsg']
+    assert [list(entry) for entry in parse_world_market_list(response)] == [record[:4] for record in old_records(records)]
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from cache import RedisBackend
+from parsers import MarketListEntry, SubListEntry
+from prices import MarketPoller, PriceTable
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+class Market:
+    '''
+    Trade market of one category with items 1 and 2, the latter with two enhancement levels.
+    '''
+    def __init__(self) -> None:
+        self.sub_lists = {1: [SubListEntry(1, 0, 0, 100, 5, 50, 90, 110, 100, 0)],
+                          2: [SubListEntry(2, 0, 0, 200, 5, 50, 190, 210, 200, 0),
+                              SubListEntry(2, 1, 1, 400, 1, 10, 390, 410, 400, 0)]}
+
+    async def get_world_market_list(self, main_category: int, sub_category: int) -> list:
+        if sub_category > 1:
+            return []
+        return [MarketListEntry(id, sub_list[0].current_stock, sub_list[0].total_trades, sub_list[0].base_price)
+                for id, sub_list in self.sub_lists.items()]
+
+    async def refresh_world_market_sub_list(self, id: int) -> list:
+        return self.sub_lists[id]
+
+
+def pollers() -> tuple:
+    '''
+    Returns a polling and a following poller sharing one fake Redis server, as two processes of a sharded bot would.
+    '''
+    server = fakeredis.FakeServer()
+    market = Market()
+    return tuple(MarketPoller(market, PriceTable(), main_categories=(1,),
+                              backend=RedisBackend(fakeredis.FakeRedis(server=server), 'test')) for _ in range(2))
+
+
+def test_followers_load_every_pass():
+    polling, following = pollers()
+
+    async def main():
+        await polling.poll()
+        loaded = await following.load_pass()
+        reloaded = await following.load_pass()
+        return loaded, reloaded
+
+    loaded, reloaded = asyncio.run(main())
+    assert (loaded, reloaded) == (True, False) # A pass is only loaded once
+    for id in (1, 2):
+        assert following.table.get_sub_list(id, 60) == polling.table.get_sub_list(id, 60)
+    assert abs(following.table.age(2) - polling.table.age(2)) < 1 # Ages are kept across processes
+
+
+def test_followers_keep_newer_entries():
+    polling, following = pollers()
+    newer = [SubListEntry(1, 0, 0, 100, 0, 51, 90, 110, 105, 1)]
+
+    async def main():
+        await polling.poll()
+        await asyncio.sleep(0.01)
+        following.table.set_sub_list(1, newer) # Fetched by a command after the pass
+        await following.load_pass()
+
+    asyncio.run(main())
+    assert following.table.get_sub_list(1, 60) == newer
+    assert following.table.get_sub_list(2, 60) == polling.table.get_sub_list(2, 60)
+
+
+def test_export_round_trips():
+    table = PriceTable()
+    table.set_sub_list(1, Market().sub_lists[2], stored_at=10)
+    copy = PriceTable()
+    copy.load(table.export())
+    assert copy.export() == table.export() == {1: (Market().sub_lists[2], 10)}
@@ -0,0 +1,60 @@
+import os, subprocess, sys
+import pytest
+import helper
+from profit import build_engine, market_id, craftable_id
+from recipes import CraftableRecipes, Ingredient, ResolvedRecipe, MARKET, VENDOR
+
+
+@pytest.fixture(autouse=True)
+def static(monkeypatch):
+    monkeypatch.setattr(helper, '_static', {'key': {'Rough Stone': 1, 'Black Stone': 2, 'Iron Ore': 3},
+                                            'craftable_name_to_id': {'Black Stone': 2},
+                                            'static_items': {'Mineral Water': 30}})
+    monkeypatch.setattr(helper, 'static_version', helper.static_version + 1)
+
+
+def recipes() -> dict:
+    return {'Black Stone': CraftableRecipes('Black Stone', 'Material', None, {
+        '1': ResolvedRecipe((Ingredient('Rough Stone', 10, MARKET), Ingredient('Mineral Water', 1, VENDOR)), {}),
+        '2': ResolvedRecipe((Ingredient('Iron Ore', 10, MARKET),), {}),
+        })}
+
+
+def test_importing_does_not_start_the_bot():
+    modules = ('item', 'market', 'prices', 'leaderboard', 'workers')
+    output = subprocess.run([sys.executable, '-c', f"import sys, profit; print([m for m in {modules!r} if m in sys.modules])"],
+                            cwd=os.path.join(os.path.dirname(__file__), '..', 'src'), capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
+
+
+def test_market_ids_ignore_case():
+    assert market_id('rough stone') == 1 and market_id('Pure Iron Crystal') is None
+    assert craftable_id('Black Stone') == 2
+
+
+def test_engine_follows_the_cheapest_recipe():
+    engine = build_engine(recipes(), market_id, craftable_id, {1: 100, 2: 1000, 3: 200})
+    profit, = engine.rank('0.0')
+    assert (profit.recipe_number, profit.cost, profit.value) == ('1', 1030, 2500)
+
+    engine.update_prices({1: 300})
+    assert engine.profit('Black Stone', '0.0').recipe_number == '2'
+    assert engine.profit('Black Stone', '0.0').margin == 2500 - 2000
+
+
+def test_unpriced_items_are_counted_not_ranked():
+    engine = build_engine(recipes(), market_id, craftable_id, {1: 100})
+    assert engine.rank('0.0') == [] and engine.unpriced('0.0') == 1
+    assert engine.unpriced('0.0', lambda category: category == 'Food') == 0
+
+    engine.update_prices({2: 1000})
+    assert len(engine.rank('0.0')) == 1 and engine.unpriced('0.0') == 0
+
+
+def test_substitutes_are_not_dependencies():
+    substituted = {'Black Stone': CraftableRecipes('Black Stone', 'Material', None, {'1': ResolvedRecipe(
+        (Ingredient('Rough Stone', 10, MARKET),), {'Rough Stone': ['Rough Stone', 'Iron Ore']})})}
+    engine = build_engine(substituted, market_id, craftable_id, {1: 100, 2: 1000})
+    version = engine.version
+    assert len(engine.update_prices({3: 10})) == 0 and engine.version == version # Iron Ore is not priced
+    assert engine.profit('Black Stone', '0.0').cost == 1000
@@ -0,0 +1,88 @@
+import time
+import pytest
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+import helper
+from recipes import RecipeStore, MARKET, VENDOR
+
+
+class Collection:
+    def __init__(self, documents: list) -> None:
+        self.documents = documents
+        self.queries = 0
+
+    def find(self, *args, **kwargs) -> list:
+        self.queries += 1
+        return [dict(document) for document in self.documents]
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('Change streams need a replica set')
+
+
+def document(_id: int, name: str, recipe: dict) -> dict:
+    return {'_id': _id, 'name': name, 'category': 'cooking', 'higher_grade': None, 'all_recipes': {'1': recipe}}
+
+
+@pytest.fixture
+def store(monkeypatch) -> RecipeStore:
+    monkeypatch.setattr(helper, '_static', {'special': {}, 'substitutions': {}, 'static_items': {'Salt': 20}})
+    collection = Collection([document(1, 'Beer', {'Wheat': 5, 'Salt': 1})])
+    return RecipeStore(collection, lambda name: name != 'Salt')
+
+
+def test_reloading_unchanged_documents_is_not_a_change(store):
+    store.load()
+    recipes = store.all()
+    store.load()
+    assert store.changes == 1
+    assert store.all() is recipes
+
+    store.collection.documents[0]['all_recipes'] = {'1': {'Wheat': 6, 'Salt': 1}}
+    store.load()
+    assert store.changes == 2
+    assert store.get('Beer').recipes['1'].ingredients[0].quantity == 6
+
+
+def test_changes_replace_the_recipes(store):
+    store.load()
+    recipes = store.all()
+    store._apply_change({'operationType': 'insert', 'documentKey': {'_id': 2},
+                         'fullDocument': document(2, 'Milk Tea', {'Milk': 3, 'Salt': 1})})
+
+    assert list(recipes) == ['Beer'] # Readers of the previous recipes do not see the change
+    assert [ingredient.kind for ingredient in store.get('Milk Tea').recipes['1'].ingredients] == [MARKET, VENDOR]
+    assert store.changes == 2
+
+    store._apply_change({'operationType': 'delete', 'documentKey': {'_id': 1}})
+    assert 'Beer' not in store and 'Beer' in recipes
+    assert store.changes == 3
+
+
+class DownCollection(Collection):
+    def find(self, *args, **kwargs) -> list:
+        if self.queries == 0:
+            self.queries += 1
+            raise ServerSelectionTimeoutError('MongoDB is down')
+        return super().find(*args, **kwargs)
+
+
+def test_starts_from_the_snapshot_while_mongodb_is_down(store, tmp_path, monkeypatch):
+    store.snapshot_path = str(tmp_path / 'craftable_items.snapshot')
+    store.load()
+
+    monkeypatch.setattr(RecipeStore, 'RETRY_INTERVAL', 0.01)
+    down = RecipeStore(DownCollection(store.collection.documents), store.is_market_item, snapshot_path=store.snapshot_path)
+    down.start()
+    assert down.get('Beer') == store.get('Beer')
+
+    for _ in range(100): # The watcher loads the collection once it is back
+        if down.fresh:
+            break
+        time.sleep(0.01)
+    assert down.fresh and down.collection.queries == 2
+
+
+def test_starts_empty_without_a_snapshot(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(RecipeStore, 'RETRY_INTERVAL', 60)
+    down = RecipeStore(DownCollection([]), store.is_market_item, snapshot_path=str(tmp_path / 'missing.snapshot'))
+    down.start()
+    assert len(down) == 0 and not down.fresh
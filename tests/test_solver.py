@@ -0,0 +1,64 @@
+import pytest
+import helper
+from recipes import CraftableRecipes, Ingredient, ResolvedRecipe, MARKET, DROP
+from solver import CraftingSolver, market_ingredients, BUY, CRAFT
+
+
+@pytest.fixture(autouse=True)
+def static(monkeypatch):
+    monkeypatch.setattr(helper, '_static', {'static_items': {}})
+
+
+def craftable(name: str, *ingredients: tuple) -> CraftableRecipes:
+    return CraftableRecipes(name, 'Material', None, {'1': ResolvedRecipe(
+        tuple(Ingredient(ingredient, quantity, MARKET) for ingredient, quantity in ingredients), {})})
+
+
+# X and Y are crafted from each other: a Material yields 2.5 items per craft
+RECIPES = {'X': craftable('X', ('Y', 2), ('A', 10)), 'Y': craftable('Y', ('X', 2), ('B', 10))}
+PRICES = {'X': 400, 'Y': 400, 'A': 10, 'B': 10}
+
+
+def test_costs_do_not_depend_on_the_item_solved_first():
+    fresh = {name: CraftingSolver(RECIPES, PRICES).unit_cost(name, '0.0') for name in ('X', 'Y')}
+    assert fresh['X'] == fresh['Y'] == ((2 * (2 * 400 + 100) / 2.5 + 100) / 2.5, CRAFT, '1')
+
+    for order in (('X', 'Y'), ('Y', 'X')):
+        solver = CraftingSolver(RECIPES, PRICES)
+        assert {name: solver.unit_cost(name, '0.0') for name in order} == fresh
+
+
+def test_cycles_are_solved_once():
+    recipes = dict(RECIPES, W=craftable('W', ('X', 1)), Z=craftable('Z', ('A', 1)))
+    solver = CraftingSolver(recipes, PRICES)
+    solver.unit_cost('W', '0.0')
+    assert solver._unit_costs[('X', '0.0')] == solver._unit_costs[('Y', '0.0')] == (328, CRAFT, '1')
+    assert solver._craft_costs[('W', '0.0')] == (328, '1')
+    assert [step.action for step in solver.tree('W', '0.0').ingredients[0].ingredients] == [CRAFT, BUY]
+
+    solver.recipes = {} # Memoized costs are served without looking at the recipes again
+    assert solver.unit_cost('Y', '0.0') == (328, CRAFT, '1')
+    assert solver.unit_cost('A', '0.0') == (10, BUY, None)
+
+
+def test_asymmetric_cycles_do_not_depend_on_the_item_solved_first():
+    recipes = {'X': craftable('X', ('Y', 1), ('A', 5)), 'Y': craftable('Y', ('Z', 3)), 'Z': craftable('Z', ('X', 1), ('B', 1))}
+    prices = {'X': 100, 'Y': 500, 'Z': 50, 'A': 10, 'B': 10}
+    costs = [{name: CraftingSolver(recipes, prices).unit_cost(name, '0.0') for name in order}
+             for order in (('X', 'Y', 'Z'), ('Z', 'Y', 'X'), ('Y', 'X', 'Z'))]
+    assert costs[0] == costs[1] == costs[2]
+
+
+def test_deep_recipe_chains():
+    recipes = {f'I{i}': craftable(f'I{i}', (f'I{i + 1}', 1)) for i in range(5000)}
+    assert CraftingSolver(recipes, {'I5000': 1}).unit_cost('I0', '0.0')[1] == CRAFT
+
+def test_craftable_drops_are_crafted():
+    # Sauce is not on the market, so recipes resolves it as a DROP, but it is craftable
+    sauce = craftable('Sauce', ('A', 100))
+    stew = CraftableRecipes('Stew', 'Material', None, {'1': ResolvedRecipe(
+        (Ingredient('Sauce', 1, DROP), Ingredient('B', 1, MARKET)), {})})
+    solver = CraftingSolver({'Sauce': sauce, 'Stew': stew}, {'A': 1000, 'B': 10})
+    assert solver.craft_cost('Stew', '0.0') == (100 * 1000 / 2.5 + 10, '1')
+    assert [step.action for step in solver.tree('Stew', '0.0').ingredients] == [CRAFT, BUY]
+    assert market_ingredients({'Sauce': sauce, 'Stew': stew}, 'Stew') == {'A', 'B'}
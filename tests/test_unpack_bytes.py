@@ -0,0 +1,80 @@
+import random, struct
+import pytest
+from unpack_bytes import pack, unpack, get_shape_decoder
+
+
+def outcome(data: bytes, fast: bool):
+    '''
+    Returns what unpack(data, fast) returns, or the type and message of what it raises.
+    '''
+    try:
+        return unpack(data, fast)
+    except Exception as e:
+        return type(e), str(e)
+
+
+def assert_same(data: bytes) -> None:
+    assert outcome(data, True) == outcome(data, False)
+
+
+def with_bits(data: bytes, bits: int) -> bytes:
+    '''
+    Returns a payload made by pack with the packed bit count replaced by bits.
+    '''
+    chars_count = struct.unpack_from('I', data, 8)[0]
+    offset = 12 + 8 * chars_count
+    return data[:offset] + struct.pack('I', bits) + data[offset + 4:]
+
+
+def random_text(rng: random.Random, alphabet: str, length: int) -> str:
+    weights = [rng.random() ** 3 for _ in alphabet] # Skewed, so that codes have many different lengths
+    return ''.join(rng.choices(alphabet, weights, k=length))
+
+
+@pytest.mark.parametrize('text', [
+    'a', # A single symbol has no code: nothing is decoded
+    'aaaaaaaaaaaaaaaaa',
+    'ab', # 1 bit codes
+    'abbbbbbb', # 8 bits, no padding
+    'abbbbbbbb', # 9 bits, 7 padding bits that would decode as more symbols
+    'ba',
+    'abc',
+    '0-1|',
+    '10-20-30|40-50-60',
+    ])
+def test_matches_the_reference_decoder(text):
+    data = pack(text)
+    assert unpack(data, False) == unpack(data, True) == (text if len(set(text)) > 1 else '')
+
+
+def test_empty_input_fails_the_same_way():
+    no_chars = struct.pack('III', 24, 0, 0) + struct.pack('III', 0, 0, 0) # What pack('') would write
+    assert_same(no_chars)
+    assert_same(b'')
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_responses_match(seed):
+    rng = random.Random(seed)
+    text = random_text(rng, '0123456789-|', rng.randint(1, 3000))
+    data = pack(text)
+    assert unpack(data, True) == unpack(data, False) == (text if len(set(text)) > 1 else '')
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_truncated_bit_counts_match(seed):
+    '''
+    A bit count that ends inside the padding, inside a code or before the last byte decodes (or fails) the same way.
+    '''
+    rng = random.Random(seed)
+    data = pack(random_text(rng, '0123456789-|', rng.randint(2, 200)))
+    packed_bits = struct.unpack_from('I', data, 12 + 8 * struct.unpack_from('I', data, 8)[0])[0]
+    for bits in {0, 1, packed_bits - 1, packed_bits + 1, packed_bits + 8, rng.randint(0, packed_bits)}:
+        assert_same(with_bits(data, max(bits, 0)))
+
+
+def test_codes_of_the_same_shape_share_a_decoder():
+    get_shape_decoder.cache_clear()
+    for text in ('abbb|', 'cddd-', '0111|'):
+        assert unpack(pack(text)) == text
+    assert get_shape_decoder.cache_info().misses == 1